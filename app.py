@@ -1,3 +1,6 @@
+import os
+import time
+
 import numpy as np
 import pandas as pd
 import pydeck as pdk
@@ -8,8 +11,14 @@ import plotly.graph_objects as go
 from streamlit_extras.dataframe_explorer import dataframe_explorer
 from streamlit_option_menu import option_menu
 
+from flights import analytics, density, explore, facts, graph, profiling, rawdata, refresh, routes, spatial
+
 st.set_page_config(layout="wide")
 
+# The flights table is shared by every session, so derived frames must never
+# write through to it. Copy-on-write also lets column selections stay views.
+pd.set_option("mode.copy_on_write", True)
+
 # Hide streamlit default menu and footer from the template
 hide_st_style = """
     <style>
@@ -19,25 +28,155 @@ hide_st_style = """
 """
 st.markdown(hide_st_style, unsafe_allow_html=True)
 
-data_url= "https://gist.githubusercontent.com/florianeichin/cfa1705e12ebd75ff4c321427126ccee/raw/c86301a0e5d0c1757d325424b8deec04cc5c5ca9/flights_all_cleaned.csv"
-data = pd.read_csv(data_url)
-# df for airlines frequency 
-df_airlines_frequency_count = data.groupby(['AIRLINE']).agg(
-    count = pd.NamedAgg(column='AIRLINE', aggfunc='count')
+# FLIGHTS_DATA may point at a local CSV file to run without network access, or
+# at a directory of flight files (CSV or Parquet) that is ingested out of core,
+# by FLIGHTS_WORKERS processes in parallel
+data_url = os.environ.get(
+    "FLIGHTS_DATA",
+    "https://gist.githubusercontent.com/florianeichin/cfa1705e12ebd75ff4c321427126ccee/raw/c86301a0e5d0c1757d325424b8deec04cc5c5ca9/flights_all_cleaned.csv",
 )
 
+# Timing of every stage of this rerun, see the sidebar debug panel
+profiler = profiling.Profiler()
+
+# The store holds the KPI cube, the filter indexes, the route table and the
+# hour histograms, all built once per dataset version. Local sources are
+# checked every FLIGHTS_REFRESH_SECONDS in the background; appended rows
+# become a new version that the next rerun picks up.
+@st.cache_resource(show_spinner="Loading flights data...")
+def load_data(source):
+    dataset = refresh.Dataset.load(source)
+    dataset.start()
+    return dataset
+
+with profiler.span('load store') as span:
+    dataset = load_data(data_url)
+    flight_store = dataset.store
+    span.rows_out = flight_store.n_rows
+data_version = flight_store.version
+data_cube = flight_store.cube
+data_index = flight_store.index
+
+# Raw rows are only read by the views that drill down into them
+@st.cache_resource(show_spinner="Loading flight rows...", max_entries=8)
+def load_rows(version, columns, _store):
+    return _store.frame(None if columns is None else list(columns))
+
+# Delay facts of the Matrix view: per-key totals from the store, rows read for the bar charts
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_delay_facts(version, _store):
+    return facts.DelayFacts.from_store(_store)
+
+# Explore columns as a shared Arrow table for the 'Advance Data Explore' view
+@st.cache_resource(show_spinner="Preparing explorer...", max_entries=2)
+def load_explore_table(version, _store):
+    return explore.ExploreTable.from_frame(_store.frame(analytics.EXPLORE_COLUMNS))
+
+# Airport grid and route arc bounds for the GEO Map Matrix radius and viewport filters
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_spatial_index(version, _store):
+    return spatial.SpatialIndex.from_routes(_store.routes)
+
+# Sparse route graph and hub ranking for the Graph Analytics view
+@st.cache_resource(show_spinner="Building route graph...", max_entries=2)
+def load_route_graph(version, _store):
+    route_graph = graph.RouteGraph.from_routes(_store.routes)
+    return route_graph, route_graph.hub_ranking()
+
+# Binned 'Elapsed Time vs Distance' scatter for views with too many points
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_scatter_extent(version, _data):
+    return density.extent(_data['DISTANCE']), density.extent(_data['ELAPSED_TIME'])
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def load_scatter_view(version, distance_range, elapsed_range, _data):
+    return analytics.scatter_view(_data, distance_range, elapsed_range)
+
+# Sort keys for the paginated Raw Data page
+@st.cache_resource(show_spinner=False, max_entries=8)
+def load_sort_ranks(version, column, ascending, _store):
+    return rawdata.sort_ranks(_store.frame([column])[column], ascending)
+
+# One great-circle arc per (origin, destination) route instead of per flight
+def route_deck(route_df, zoom, latitude=38.5260, longitude=-115.766):
+    return pdk.Deck(
+        map_style=None,
+        initial_view_state=pdk.ViewState(
+            latitude=latitude,
+            longitude=longitude,
+            zoom=zoom,
+            pitch=2,
+        ),
+        layers=[
+            pdk.Layer(
+            "GreatCircleLayer",
+            data=route_df,
+            pickable=True,
+            get_stroke_width="WIDTH",
+            get_source_position=["ORIGIN_AIRPORT_LON", "ORIGIN_AIRPORT_LAT"],
+            get_target_position=["DESTINATION_AIRPORT_LON", "DESTINATION_AIRPORT_LAT"],
+            get_source_color="SOURCE_COLOR",
+            get_target_color="TARGET_COLOR",
+            auto_highlight=True,
+            ),
+        ],
+        tooltip={"text": "{ORIGIN_AIRPORT} - {DESTINATION_AIRPORT}\n{FLIGHTS} flights"},
+    )
+
+# Same widgets as dataframe_explorer, filtered with pyarrow.compute
+def arrow_explorer(explore_table):
+    columns = st.multiselect('Columns', explore_table.columns, default=explore_table.columns)
+    to_filter_columns = st.multiselect('Filter dataframe on', explore_table.columns)
+    filters = {}
+    for column in to_filter_columns:
+        left, right = st.columns((1, 20))
+        left.write("↳")
+        kind = explore_table.kinds[column]
+        if kind == 'category':
+            values = explore_table.values(column)
+            filters[column] = right.multiselect(f"Values for {column}", values, default=values)
+        elif kind == 'range':
+            _min, _max = explore_table.value_range(column)
+            filters[column] = right.slider(f"Values for {column}", _min, _max, (_min, _max), step=(_max - _min) / 100)
+        else:
+            filters[column] = right.text_input(f"Pattern in {column}")
+    return explore_table.filter(filters, columns=columns or None)
+
+# Matrix bar charts drawn from one bar per category and delay, shared across
+# sessions; the oldest figures are evicted past max_entries
+@st.cache_resource(show_spinner=False, max_entries=64)
+def load_delay_bar_figure(version, category, filter_column, selection, statistic, title, xaxis_title, width, _facts):
+    bars = _facts.delay_bars(category, facts.BAR_STATISTICS[statistic], **{filter_column: list(selection)})
+    fig = px.bar(bars, x=category, y=facts.DELAYS, barmode='group', height=400, width=width)
+    fig.update_layout(
+            title=title,
+            xaxis_title=xaxis_title,
+            yaxis_title="%s delay (in Minutes)" % statistic,
+            legend_title="Delay",
+        )
+    return fig
+
 with st.sidebar:
     nav_menu = option_menu("Main Menu", ["Dashboard", "Map Analyzer", 'Query Analyzer', 'Raw Data'], 
         icons=['clipboard-data', 'map', 'gear'], menu_icon="cast", default_index=0)
 
+is_debug_panel = st.sidebar.checkbox('Performance debug panel')
+st.sidebar.caption('Data version %s, checked at %s' % (data_version, time.strftime('%H:%M:%S', time.localtime(dataset.refreshed_at))))
+if dataset.error:
+    st.sidebar.caption('Last refresh failed: %s' % dataset.error)
+profiler.page = nav_menu
+profiler.measure_payloads = profiler.measure_payloads or is_debug_panel
+
 if nav_menu == "Dashboard":
     #st.header("Dashboard")
 
     col_flight, col_average_delay_time, col_max_trip, col_busy_port = st.columns(4)
-    no_flight = data.shape[0]
-    ave_delay_time = round(data['DEPARTURE_DELAY'].mean(), 2)
-    max_frequency=data['AIRLINE'].value_counts().idxmax()
-    max_frequency_airpirt=data['DESTINATION_AIRPORT'].value_counts().idxmax()
+    with profiler.span('kpis'):
+        kpis = analytics.dashboard_kpis(data_cube)
+    no_flight = kpis['flights']
+    ave_delay_time = kpis['mean_departure_delay']
+    max_frequency = kpis['top_airline']
+    max_frequency_airpirt = kpis['busiest_airport']
 
     st.markdown(
     """
@@ -73,30 +212,49 @@ if nav_menu == "Dashboard":
 
     with col_barChart:
         st.write('Number of flights operate by Airline')
-        st.bar_chart(df_airlines_frequency_count)
+        df_airlines_frequency_count = analytics.airline_frequency(data_cube)
+        profiler.render('st.bar_chart airlines', st.bar_chart, df_airlines_frequency_count)
     
     with col_scat_chart:
         st.write('Elapsed Time vs Distance')
-        chart = alt.Chart(data).mark_circle(size=60).encode(
-            x='DISTANCE',
-            y='ELAPSED_TIME',
-            color='AIRLINE',
-            tooltip=['AIRLINE', 'ORIGIN_AIRPORT', 'ELAPSED_TIME', 'FLIGHT_NUMBER', 'DISTANCE', 'DESTINATION_AIRPORT']
-        ).interactive()
-        st.altair_chart(chart, theme="streamlit", use_container_width=True)
+        with profiler.span('scatter rows') as span:
+            scatter_df = load_rows(data_version, tuple(analytics.SCATTER_COLUMNS), flight_store)
+            span.rows_out = len(scatter_df)
+        distance_extent, elapsed_extent = load_scatter_extent(data_version, scatter_df)
+        distance_range = st.slider('Distance', min_value=distance_extent[0], max_value=distance_extent[1], value=distance_extent)
+        elapsed_range = st.slider('Elapsed time', min_value=elapsed_extent[0], max_value=elapsed_extent[1], value=elapsed_extent)
+        with profiler.span('scatter view', rows_in=len(scatter_df)) as span:
+            scatter_mode, scatter_data = load_scatter_view(data_version, distance_range, elapsed_range, scatter_df)
+            span.rows_out = len(scatter_data)
+
+        if scatter_mode == 'points':
+            chart = alt.Chart(scatter_data).mark_circle(size=60).encode(
+                x='DISTANCE',
+                y='ELAPSED_TIME',
+                color='AIRLINE',
+                tooltip=['AIRLINE', 'ORIGIN_AIRPORT', 'ELAPSED_TIME', 'FLIGHT_NUMBER', 'DISTANCE', 'DESTINATION_AIRPORT']
+            ).interactive()
+        else:
+            # Too many flights in view: draw per-airline bin counts instead of points
+            st.caption('Showing flight density. Narrow the ranges to %d flights or fewer to see individual flights.' % density.POINT_LIMIT)
+            chart = alt.Chart(scatter_data).mark_rect().encode(
+                x=alt.X('x_start:Q', title='DISTANCE'),
+                x2='x_end',
+                y=alt.Y('y_start:Q', title='ELAPSED_TIME'),
+                y2='y_end',
+                color='AIRLINE',
+                opacity=alt.Opacity('count:Q', scale=alt.Scale(type='log'), legend=None),
+                tooltip=['AIRLINE', 'count']
+            )
+        profiler.render('st.altair_chart scatter', st.altair_chart, chart, theme="streamlit", use_container_width=True)
     
     col_delay_dpt, col_delay_dist = st.columns(2)
 
     with col_delay_dpt:
         st.write("Operation performance (Departure Delay)")
-        df_delay_dpt = data[(data['DEPARTURE_DELAY'] < 0)]
-        
-        line_chart_dpt = df_delay_dpt
-        line_chart_dpt['SCHEDULED_DEPARTURE'] = pd.to_datetime(line_chart_dpt['SCHEDULED_DEPARTURE'])
-        line_chart_dpt['DEPARTURE_HOUR'] = line_chart_dpt['SCHEDULED_DEPARTURE'].dt.hour
-
-        hours_cross_tbl = pd.crosstab(line_chart_dpt['DEPARTURE_HOUR'], line_chart_dpt['ORIGIN_AIRPORT'])
-        fig = px.line(hours_cross_tbl)
+        hours_cross_tbl, hours_cross_tbl_dist = flight_store.hour_counts
+        with profiler.span('plotly figure departure hours'):
+            fig = px.line(hours_cross_tbl)
         
         fig.update_layout(
             #title="Time (Hour) vs Departure Delay (in Min)",
@@ -104,18 +262,13 @@ if nav_menu == "Dashboard":
             yaxis_title="Time delay for departure (in Minutes)",
             legend_title="Airport",
         )
-        st.write(fig)
+        profiler.render('st.write departure hours', st.write, fig)
 
     with col_delay_dist:
         st.write("Opetation performance (Destination Delay)")
-        df_delay_dist = data[(data['DESTINATION_DELAY'] < 0)]
-
-        line_chart_dist = df_delay_dist
-        line_chart_dist['SCHEDULED_DESTINATION'] = pd.to_datetime(line_chart_dist['SCHEDULED_DESTINATION'])
-        line_chart_dist['DESTINATION_HOUR'] = line_chart_dist['SCHEDULED_DESTINATION'].dt.hour
-
-        hours_cross_tbl_dist = pd.crosstab(line_chart_dist['DESTINATION_HOUR'], line_chart_dist['DESTINATION_AIRPORT'])
-        fig = px.line(hours_cross_tbl_dist)
+        hours_cross_tbl, hours_cross_tbl_dist = flight_store.hour_counts
+        with profiler.span('plotly figure destination hours'):
+            fig = px.line(hours_cross_tbl_dist)
         
         fig.update_layout(
             #title="Time (Hour) vs Destination Delay (in Min)",
@@ -123,78 +276,46 @@ if nav_menu == "Dashboard":
             yaxis_title="Time delay for arrival (in Minutes)",
             legend_title="Airport",
         )
-        st.write(fig)
+        profiler.render('st.write destination hours', st.write, fig)
 
 elif nav_menu == "Map Analyzer":
     st.write("**Data exploration with map**")
 
-    GREEN_RGB = [0, 255, 0, 0]
-    RED_RGB = [250, 100, 0, 40]
-
-
-    st.pydeck_chart(pdk.Deck(
-        map_style=None,
-        initial_view_state=pdk.ViewState(
-            latitude=38.5260,
-            longitude=-115.766,
-            zoom=3,
-            pitch=2,
-        ),
-        layers=[
-            pdk.Layer(
-            "GreatCircleLayer",
-            data=data,
-            pickable=True,
-            get_stroke_width=20,
-            get_source_position=["ORIGIN_AIRPORT_LON", "ORIGIN_AIRPORT_LAT"],
-            get_target_position=["DESTINATION_AIRPORT_LON", "DESTINATION_AIRPORT_LAT"],
-            get_source_color=RED_RGB,
-            get_target_color=GREEN_RGB,
-            auto_highlight=True,
-            ),
-        ],
-    ))
+    map_detail = st.select_slider('Map detail', options=list(routes.DETAIL_LEVELS))
+    with profiler.span('route payload', rows_in=len(flight_store.routes)) as span:
+        route_df = analytics.map_payload(flight_store.routes, map_detail)
+        span.rows_out = len(route_df)
+    profiler.render('st.pydeck_chart routes', st.pydeck_chart, route_deck(route_df, zoom=3))
 
     col_airline, col_origine_port, col_dist_port = st.columns(3)
     
     with col_airline:
         st.subheader("Flights per airlins")
-        max_frequency_airline=data['AIRLINE'].value_counts()
-        st.dataframe(max_frequency_airline, use_container_width=True)
+        max_frequency_airline, max_frequency_origin_port, max_frequency_distination_port = analytics.frequency_tables(data_cube)
+        profiler.render('st.dataframe airlines', st.dataframe, max_frequency_airline, use_container_width=True)
 
     with col_origine_port:
         st.subheader("Flights as per Origine Port")
-        max_frequency_origin_port=data['ORIGIN_AIRPORT'].value_counts()
-        st.dataframe(max_frequency_origin_port, use_container_width=True)
+        profiler.render('st.dataframe origin ports', st.dataframe, max_frequency_origin_port, use_container_width=True)
 
     with col_dist_port:
         st.subheader("Flights as per Destination Port")
-        max_frequency_distination_port=data['DESTINATION_AIRPORT'].value_counts()
-        st.dataframe(max_frequency_distination_port, use_container_width=True) 
+        profiler.render('st.dataframe destination ports', st.dataframe, max_frequency_distination_port, use_container_width=True)
 
 ########### Query Analyzer ##########
 
 elif nav_menu == 'Query Analyzer':
 
-    default_df = pd.DataFrame(data, columns=['AIRLINE', 'ORIGIN_AIRPORT', 'DESTINATION_AIRPORT', 'SCHEDULED_TIME', 'ELAPSED_TIME', 'DEPARTURE_DELAY', 'DESTINATION_DELAY', 'ORIGIN_AIRPORT_LAT', 'ORIGIN_AIRPORT_LON', 'DESTINATION_AIRPORT_LAT', 'DESTINATION_AIRPORT_LON'])
-    is_analyzer_select = st.sidebar.radio('Please select option', ('Matrix', 'GEO Map Matrix', 'Advance Data Explore'))
+    is_analyzer_select = st.sidebar.radio('Please select option', ('Matrix', 'GEO Map Matrix', 'Advance Data Explore', 'Graph Analytics'))
     
     if is_analyzer_select == 'Matrix':
 
         st.write("**Advance Query Analyzed**")
         
         ##### delay #####
-        delay_departure = default_df[(default_df['DEPARTURE_DELAY'] < 0)]
-        df_delay_destination = default_df[(default_df['DESTINATION_DELAY'] < 0)]
-
-        delay_departure['DEPARTURE_DELAY'] = delay_departure['DEPARTURE_DELAY'].abs()
-        df_delay_destination['DESTINATION_DELAY'] = df_delay_destination['DESTINATION_DELAY'].abs()
-
-        convert_departure = delay_departure.assign(CONV_DPTUR=delay_departure['DEPARTURE_DELAY'])
-        convert_destination = df_delay_destination.assign(CONV_DEST=df_delay_destination['DESTINATION_DELAY'])
-
-        result_port_delay = pd.concat([default_df['AIRLINE'], convert_departure['ORIGIN_AIRPORT'], convert_departure['CONV_DPTUR'], convert_destination['DESTINATION_AIRPORT'], convert_destination['CONV_DEST'], default_df['ELAPSED_TIME'], default_df['ORIGIN_AIRPORT_LAT'], default_df['ORIGIN_AIRPORT_LON'], default_df['DESTINATION_AIRPORT_LAT'], default_df['DESTINATION_AIRPORT_LON']], axis=1, join='inner')
-        result_port_delay = result_port_delay.rename(columns={'CONV_DPTUR': 'Departure Delay', 'CONV_DEST': 'Destination Delay'})
+        with profiler.span('delay facts') as span:
+            delay_facts = load_delay_facts(data_version, flight_store)
+            span.rows_out = delay_facts.n_rows
         #st.write(result_port_delay)
 
         ###### Filtering feature #####
@@ -205,52 +326,64 @@ elif nav_menu == 'Query Analyzer':
         col_origin_count, col_destination_count, col_airline_count = st.columns(3)
             
         with col_origin_count:
-            options_origin_port = result_port_delay['ORIGIN_AIRPORT'].unique().tolist()
+            options_origin_port = delay_facts.options('ORIGIN_AIRPORT')
             selected_options_origin = st.multiselect('Select Origin Airport(You can modify defailt selection)',options_origin_port, default=options_origin_port[0:3])
 
-            filter_origin_df = result_port_delay.query('ORIGIN_AIRPORT == @selected_options_origin')
-            total_origin_flight = filter_origin_df['ORIGIN_AIRPORT'].value_counts().sum()
-            sum_of_origin_delay = filter_origin_df['Departure Delay'].sum()
+            with profiler.span('origin totals', rows_in=len(selected_options_origin)):
+                total_origin_flight, sum_of_origin_delay = analytics.delay_metrics(delay_facts, 'ORIGIN_AIRPORT', selected_options_origin, 'Departure Delay')
             st.metric(label = 'Total Flight in Origin Airport', value= total_origin_flight)
             st.metric(label = 'Total delay at Origin Airport (in miniuts)', value= sum_of_origin_delay)
                         
         with col_destination_count:
-            options_destination_port = result_port_delay['DESTINATION_AIRPORT'].unique().tolist()
+            options_destination_port = delay_facts.options('DESTINATION_AIRPORT')
             selected_options_destination = st.multiselect('Select Destination Airport(You can modify defailt selection)',options_destination_port, default=options_destination_port[0:3])
 
-            filter_destination_df = result_port_delay.query('DESTINATION_AIRPORT == @selected_options_destination')
-            total_distation_flight = filter_destination_df['DESTINATION_AIRPORT'].value_counts().sum()
-            sum_of_destination_delay = filter_destination_df['Destination Delay'].sum()
+            with profiler.span('destination totals', rows_in=len(selected_options_destination)):
+                total_distation_flight, sum_of_destination_delay = analytics.delay_metrics(delay_facts, 'DESTINATION_AIRPORT', selected_options_destination, 'Destination Delay')
             st.metric(label = 'Total Flight in Destination Airport', value= total_distation_flight)
             st.metric(label = 'Total delay at Destination Airport (in miniuts)', value= sum_of_destination_delay)
             
         with col_airline_count:
-            options_airline = result_port_delay['AIRLINE'].unique().tolist()
+            options_airline = delay_facts.options('AIRLINE')
             selected_options_airline = st.multiselect('Select Airline(You can modify defailt selection)',options_airline, default=options_airline[0:3])
 
-            filter_airline_df = result_port_delay.query('AIRLINE == @selected_options_airline')
-            total_airline_count = filter_airline_df['AIRLINE'].value_counts().sum()
-            sum_of_elecips_time = filter_airline_df['ELAPSED_TIME'].sum()
+            with profiler.span('airline totals', rows_in=len(selected_options_airline)):
+                total_airline_count, sum_of_elecips_time = analytics.delay_metrics(delay_facts, 'AIRLINE', selected_options_airline, 'ELAPSED_TIME')
             st.metric(label = 'Total Airline Operation', value= total_airline_count)
             st.metric(label = 'Total Elapsed Time (in miniuts)', value= sum_of_elecips_time)
         ###### End ######
 
+        ##### Delay percentiles #####
+        st.write("**Delay percentiles**")
+        col_percentile_airline, col_percentile_airport, col_percentile_hour = st.columns(3)
+        with col_percentile_airline:
+            selected_percentile_airlines = st.multiselect('Airlines (all when empty)', data_index['AIRLINE'].values())
+        with col_percentile_airport:
+            # Departures are sketched by origin and arrivals by destination airport
+            options_percentile_airports = list(dict.fromkeys(data_index['ORIGIN_AIRPORT'].values() + data_index['DESTINATION_AIRPORT'].values()))
+            selected_percentile_airports = st.multiselect('Airports (all when empty)', options_percentile_airports)
+        with col_percentile_hour:
+            selected_percentile_hours = st.multiselect('Hours (all when empty)', list(range(24)))
+
+        with profiler.span('delay percentiles'):
+            delay_percentiles = analytics.delay_percentiles(flight_store.sketches, selected_percentile_airlines,
+                                                            selected_percentile_airports, selected_percentile_hours)
+        for measure, label in (('DEPARTURE_DELAY', 'Departure'), ('DESTINATION_DELAY', 'Arrival')):
+            for col_percentile, (percentile, value) in zip(st.columns(3), delay_percentiles[measure].items()):
+                col_percentile.metric(label='%s delay p%d (min)' % (label, percentile), value=round(value, 1))
+        ###### End ######
+
         ##### Filter with Airlines #####
-        options_airline_for_bar = default_df['AIRLINE'].unique().tolist()
-        selected_options_airline_for_bar = st.multiselect('Select Airline(You can modify defailt selection)',options_airline_for_bar, default=options_airline_for_bar[0:1])
+        bar_statistic = st.radio('Bar value', list(facts.BAR_STATISTICS), horizontal=True)
 
-        filter_airline__for_chart_df = result_port_delay.query('AIRLINE == @selected_options_airline_for_bar')
+        options_airline_for_bar = data_index['AIRLINE'].values()
+        selected_options_airline_for_bar = st.multiselect('Select Airline(You can modify defailt selection)',options_airline_for_bar, default=options_airline_for_bar[0:1])
 
-        fig = px.bar(filter_airline__for_chart_df, x=filter_airline__for_chart_df['ORIGIN_AIRPORT'], y=[filter_airline__for_chart_df['Departure Delay'], filter_airline__for_chart_df['Destination Delay'],], barmode='group', height=400, width=1200)
+        with profiler.span('plotly figure origin ports', rows_in=delay_facts.n_rows):
+            fig = load_delay_bar_figure(data_version, 'ORIGIN_AIRPORT', 'AIRLINE', tuple(selected_options_airline_for_bar), bar_statistic,
+                                        "Origin Port vs Departure Delay vs Destination Delay", "Airport", 1200, delay_facts)
 
-        fig.update_layout(
-                title="Origin Port vs Departure Delay vs Destination Delay",
-                xaxis_title="Airport",
-                yaxis_title="Delay for departure (in Minutes)",
-                legend_title="Delay",
-            )
-
-        st.plotly_chart(fig)
+        profiler.render('st.plotly_chart fig', st.plotly_chart, fig)
         ###### End ######
 
         ###### Filter with origin port ######
@@ -258,58 +391,62 @@ elif nav_menu == 'Query Analyzer':
         
         with col_filter_origin_port:
 
-            options_origin_port_for_bar = default_df['ORIGIN_AIRPORT'].unique().tolist()
+            options_origin_port_for_bar = data_index['ORIGIN_AIRPORT'].values()
             selected_options_origin_port_for_bar = st.multiselect('Select Origin Port(You can modify defailt selection)',options_origin_port_for_bar, default=options_origin_port_for_bar[0:1])
 
-            filter_origin_port_for_chart_df = result_port_delay.query('ORIGIN_AIRPORT == @selected_options_origin_port_for_bar')
-
-            fig_origin = px.bar(filter_origin_port_for_chart_df, x=filter_origin_port_for_chart_df['AIRLINE'], y=[filter_origin_port_for_chart_df['Departure Delay'], filter_origin_port_for_chart_df['Destination Delay'],], barmode='group', height=400)
+            with profiler.span('plotly figure origin airlines', rows_in=delay_facts.n_rows):
+                fig_origin = load_delay_bar_figure(data_version, 'AIRLINE', 'ORIGIN_AIRPORT', tuple(selected_options_origin_port_for_bar), bar_statistic,
+                                                   "Air Lines vs Departure Delay vs Destination Delay", "Airlins", None, delay_facts)
 
-            fig_origin.update_layout(
-                    title="Air Lines vs Departure Delay vs Destination Delay",
-                    xaxis_title="Airlins",
-                    yaxis_title="Delay for departure (in Minutes)",
-                    legend_title="Delay",
-                )
-
-            st.plotly_chart(fig_origin)
+            profiler.render('st.plotly_chart fig_origin', st.plotly_chart, fig_origin)
         ##### End ######
 
         ###### Filter with Destination port ######
         with col_filter_dest_port:
 
-            options_dest_port_for_bar = default_df['DESTINATION_AIRPORT'].unique().tolist()
+            options_dest_port_for_bar = data_index['DESTINATION_AIRPORT'].values()
             selected_options_dest_port_for_bar = st.multiselect('Select Destination Port(You can modify defailt selection)',options_dest_port_for_bar, default=options_dest_port_for_bar[0:1])
 
-            filter_dest_port_for_chart_df = result_port_delay.query('DESTINATION_AIRPORT == @selected_options_dest_port_for_bar')
-
-            fig_dest = px.bar(filter_dest_port_for_chart_df, x=filter_dest_port_for_chart_df['AIRLINE'], y=[filter_dest_port_for_chart_df['Departure Delay'], filter_dest_port_for_chart_df['Destination Delay'],], barmode='group', height=400)
+            with profiler.span('plotly figure destination airlines', rows_in=delay_facts.n_rows):
+                fig_dest = load_delay_bar_figure(data_version, 'AIRLINE', 'DESTINATION_AIRPORT', tuple(selected_options_dest_port_for_bar), bar_statistic,
+                                                 "Air Lines vs Departure Delay vs Destination Delay", "Airlins", None, delay_facts)
 
-            fig_dest.update_layout(
-                    title="Air Lines vs Departure Delay vs Destination Delay",
-                    xaxis_title="Airlins",
-                    yaxis_title="Delay for departure (in Minutes)",
-                    legend_title="Delay",
-                )
-
-            st.plotly_chart(fig_dest)
+            profiler.render('st.plotly_chart fig_dest', st.plotly_chart, fig_dest)
         ##### End ######
     
     elif is_analyzer_select == 'Advance Data Explore':
         st.write("**Advance Raw Data Explore**")
-        filtered_data_column = pd.DataFrame(data, columns=['AIRLINE', 'ORIGIN_AIRPORT', 'DESTINATION_AIRPORT', 'SCHEDULED_TIME', 'ELAPSED_TIME', 'DEPARTURE_DELAY', 'DESTINATION_DELAY'])
-        filtered_df = dataframe_explorer(filtered_data_column, case=False)
-        st.dataframe(filtered_df, use_container_width=True)
+        explore_engine = st.radio('Explorer engine', ('Arrow', 'pandas'), horizontal=True)
+        if explore_engine == 'Arrow':
+            explore_table = load_explore_table(data_version, flight_store)
+            with profiler.span('explorer filter', rows_in=explore_table.table.num_rows) as span:
+                explore_rows, explore_matches = arrow_explorer(explore_table)
+                filtered_df = explore_rows.to_pandas()
+                span.rows_out = explore_matches
+            if explore_matches > len(filtered_df):
+                st.caption('Showing the first %d of %d matching rows' % (len(filtered_df), explore_matches))
+        else:
+            filtered_data_column = load_rows(data_version, tuple(analytics.EXPLORE_COLUMNS), flight_store)
+            with profiler.span('explorer filter', rows_in=len(filtered_data_column)) as span:
+                filtered_df = dataframe_explorer(filtered_data_column, case=False)
+                span.rows_out = len(filtered_df)
+        profiler.render('st.dataframe explorer', st.dataframe, filtered_df, use_container_width=True)
 
     elif is_analyzer_select == 'GEO Map Matrix':
         st.write("**GEO Map Matrix**")
-        default_map_df = pd.DataFrame(data, columns=['AIRLINE', 'ORIGIN_AIRPORT', 'DESTINATION_AIRPORT', 'SCHEDULED_TIME', 'ELAPSED_TIME', 'DEPARTURE_DELAY', 'DESTINATION_DELAY', 'ORIGIN_AIRPORT_LAT', 'ORIGIN_AIRPORT_LON', 'DESTINATION_AIRPORT_LAT', 'DESTINATION_AIRPORT_LON'])
 
         ###### Filter for GEO Map ######
-        GREEN_RGB = [0, 255, 0, 0]
-        RED_RGB = [250, 100, 0, 40]
-
-        is_filter_option = st.radio('**Filter with**', ('Origin Port', 'Airlines'), horizontal=True)
+        is_filter_option = st.radio('**Filter with**', ('Origin Port', 'Airlines', 'Near a point'), horizontal=True)
+        map_detail = st.select_slider('Map detail', options=list(routes.DETAIL_LEVELS))
+        spatial_index = load_spatial_index(data_version, flight_store)
+
+        with st.expander('Map viewport'):
+            viewport_lat = st.slider('Latitude', -90.0, 90.0, (-90.0, 90.0))
+            viewport_lon = st.slider('Longitude', -180.0, 180.0, (-180.0, 180.0))
+        viewport = (viewport_lat[0], viewport_lon[0], viewport_lat[1], viewport_lon[1])
+        viewport_center = {'latitude': sum(viewport_lat) / 2, 'longitude': sum(viewport_lon) / 2}
+        if viewport == (-90.0, -180.0, 90.0, 180.0):
+            viewport, viewport_center = None, {}
         
         #### With airline filter ####
         if is_filter_option == "Origin Port":
@@ -318,39 +455,28 @@ elif nav_menu == 'Query Analyzer':
 
             with col_map_filter:
 
-                options_for_airline = data['ORIGIN_AIRPORT'].unique().tolist()
+                options_for_airline = data_index['ORIGIN_AIRPORT'].values()
                 selected_options_airlines = st.multiselect('Select Origin Port(You can modify defailt selection)',options_for_airline, default=options_for_airline[0:3])
 
-                filter_airline_df = default_df.query('ORIGIN_AIRPORT == @selected_options_airlines')
-
-                st.pydeck_chart(pdk.Deck(
-                    map_style=None,
-                    initial_view_state=pdk.ViewState(
-                        latitude=38.5260,
-                        longitude=-115.766,
-                        zoom=2,
-                        pitch=2,
-                    ),
-                    layers=[
-                        pdk.Layer(
-                        "GreatCircleLayer",
-                        data=filter_airline_df,
-                        pickable=True,
-                        get_stroke_width=20,
-                        get_source_position=["ORIGIN_AIRPORT_LON", "ORIGIN_AIRPORT_LAT"],
-                        get_target_position=["DESTINATION_AIRPORT_LON", "DESTINATION_AIRPORT_LAT"],
-                        get_source_color=RED_RGB,
-                        get_target_color=GREEN_RGB,
-                        auto_highlight=True,
-                        ),
-                    ],
-                ))
+                with profiler.span('filter rows', rows_in=flight_store.n_rows) as span:
+                    filter_airline_df = analytics.geo_rows(flight_store, data_index, ORIGIN_AIRPORT=selected_options_airlines)
+                    span.rows_out = len(filter_airline_df)
+
+                with profiler.span('route payload', rows_in=len(filter_airline_df)) as span:
+                    route_df = routes.route_payload(filter_airline_df, min_flights=routes.DETAIL_LEVELS[map_detail])
+                    span.rows_out = len(route_df)
+                if viewport is not None:
+                    with profiler.span('viewport filter', rows_in=len(route_df)) as span:
+                        route_df = route_df[spatial_index.arcs_in_view(route_df, *viewport)]
+                        span.rows_out = len(route_df)
+                profiler.render('st.pydeck_chart routes', st.pydeck_chart, route_deck(route_df, zoom=2, **viewport_center))
 
             with col_sum_trip:
-                total_airline_count = filter_airline_df['ORIGIN_AIRPORT'].value_counts().sum()
-                sum_of_origin_elepsed = filter_airline_df['ELAPSED_TIME'].sum()
-                sum_of_dept_delay = filter_airline_df['DEPARTURE_DELAY'].sum()
-                sum_of_dest_delay = filter_airline_df['DESTINATION_DELAY'].sum()
+                geo_metrics = analytics.geo_metrics(filter_airline_df)
+                total_airline_count = geo_metrics['flights']
+                sum_of_origin_elepsed = geo_metrics['elapsed_time']
+                sum_of_dept_delay = geo_metrics['departure_delay']
+                sum_of_dest_delay = geo_metrics['destination_delay']
                 st.write("")
                 st.write("")
                 st.write("")
@@ -370,39 +496,28 @@ elif nav_menu == 'Query Analyzer':
 
             with col_map_filter:
 
-                options_for_airline = data['AIRLINE'].unique().tolist()
+                options_for_airline = data_index['AIRLINE'].values()
                 selected_options_airlines = st.multiselect('Select Origin Port(You can modify defailt selection)',options_for_airline, default=options_for_airline[0:3])
 
-                filter_airline_df = default_df.query('AIRLINE == @selected_options_airlines')
-
-                st.pydeck_chart(pdk.Deck(
-                    map_style=None,
-                    initial_view_state=pdk.ViewState(
-                        latitude=38.5260,
-                        longitude=-115.766,
-                        zoom=2,
-                        pitch=2,
-                    ),
-                    layers=[
-                        pdk.Layer(
-                        "GreatCircleLayer",
-                        data=filter_airline_df,
-                        pickable=True,
-                        get_stroke_width=20,
-                        get_source_position=["ORIGIN_AIRPORT_LON", "ORIGIN_AIRPORT_LAT"],
-                        get_target_position=["DESTINATION_AIRPORT_LON", "DESTINATION_AIRPORT_LAT"],
-                        get_source_color=RED_RGB,
-                        get_target_color=GREEN_RGB,
-                        auto_highlight=True,
-                        ),
-                    ],
-                ))
+                with profiler.span('filter rows', rows_in=flight_store.n_rows) as span:
+                    filter_airline_df = analytics.geo_rows(flight_store, data_index, AIRLINE=selected_options_airlines)
+                    span.rows_out = len(filter_airline_df)
+
+                with profiler.span('route payload', rows_in=len(filter_airline_df)) as span:
+                    route_df = routes.route_payload(filter_airline_df, min_flights=routes.DETAIL_LEVELS[map_detail])
+                    span.rows_out = len(route_df)
+                if viewport is not None:
+                    with profiler.span('viewport filter', rows_in=len(route_df)) as span:
+                        route_df = route_df[spatial_index.arcs_in_view(route_df, *viewport)]
+                        span.rows_out = len(route_df)
+                profiler.render('st.pydeck_chart routes', st.pydeck_chart, route_deck(route_df, zoom=2, **viewport_center))
 
             with col_sum_trip:
-                total_airline_count = filter_airline_df['ORIGIN_AIRPORT'].value_counts().sum()
-                sum_of_origin_elepsed = filter_airline_df['ELAPSED_TIME'].sum()
-                sum_of_dept_delay = filter_airline_df['DEPARTURE_DELAY'].sum()
-                sum_of_dest_delay = filter_airline_df['DESTINATION_DELAY'].abs().sum()
+                geo_metrics = analytics.geo_metrics(filter_airline_df, absolute_destination_delay=True)
+                total_airline_count = geo_metrics['flights']
+                sum_of_origin_elepsed = geo_metrics['elapsed_time']
+                sum_of_dept_delay = geo_metrics['departure_delay']
+                sum_of_dest_delay = geo_metrics['destination_delay']
                 st.write("")
                 st.write("")
                 st.write("")
@@ -414,19 +529,94 @@ elif nav_menu == 'Query Analyzer':
                 st.metric(label = 'Total Origon Delay time (Minitus)', value= sum_of_dept_delay)
                 st.metric(label = 'Total Destination Delay (Minitus)', value= sum_of_dest_delay)
         ###### End #####
-            
+        #### With radius filter ####
+        elif is_filter_option == "Near a point":
+
+            col_map_filter, col_sum_trip = st.columns([3, 1])
+
+            with col_map_filter:
+
+                col_point_lat, col_point_lon, col_point_radius = st.columns(3)
+                point_lat = col_point_lat.number_input('Latitude', -90.0, 90.0, 40.6413)
+                point_lon = col_point_lon.number_input('Longitude', -180.0, 180.0, -73.7781)
+                radius_km = col_point_radius.slider('Radius (km)', 10, 2000, 200, step=10)
+
+                with profiler.span('airports near point') as span:
+                    near_airports = spatial_index.near(point_lat, point_lon, radius_km)
+                    span.rows_out = len(near_airports)
+                st.write('Airports within %d km: %s' % (radius_km, ', '.join(near_airports) or 'none'))
+
+                with profiler.span('filter rows', rows_in=flight_store.n_rows) as span:
+                    filter_airline_df = analytics.geo_rows_near(flight_store, data_index, near_airports)
+                    span.rows_out = len(filter_airline_df)
+
+                with profiler.span('route payload', rows_in=len(filter_airline_df)) as span:
+                    route_df = routes.route_payload(filter_airline_df, min_flights=routes.DETAIL_LEVELS[map_detail])
+                    span.rows_out = len(route_df)
+                if viewport is not None:
+                    with profiler.span('viewport filter', rows_in=len(route_df)) as span:
+                        route_df = route_df[spatial_index.arcs_in_view(route_df, *viewport)]
+                        span.rows_out = len(route_df)
+                profiler.render('st.pydeck_chart routes', st.pydeck_chart, route_deck(route_df, zoom=2, **viewport_center))
+
+            with col_sum_trip:
+                geo_metrics = analytics.geo_metrics(filter_airline_df)
+                st.write("")
+                st.write("")
+                st.write("")
+                st.write("")
+                st.write("")
+                st.write("")
+                st.metric(label = 'Total Flight touching these ports', value= geo_metrics['flights'])
+                st.metric(label = 'Total Elepsed time (Minitus)', value= geo_metrics['elapsed_time'])
+                st.metric(label = 'Total Origon Delay time (Minitus)', value= geo_metrics['departure_delay'])
+                st.metric(label = 'Total Destination Delay (Minitus)', value= geo_metrics['destination_delay'])
+        ###### End #####
+
 
     elif is_analyzer_select == 'Graph Analytics':
-        
-        ##########
-        df_delay_depture = default_df[(default_df['DEPARTURE_DELAY'] < 0)]
-        df_delay_depture['DEPARTURE_DELAY']=df_delay_depture['DEPARTURE_DELAY'].astype('str')
-        df_delay_depture['DEPARTURE_DELAY']=df_delay_depture['DEPARTURE_DELAY'].str.replace('-','')
-        df_delay_depture['DEPARTURE_DELAY']=df_delay_depture['DEPARTURE_DELAY'].astype('float')
 
-        df_delay_depture['SCHEDULED_DEPARTURE'] = pd.to_datetime(df_delay_depture.SCHEDULED_DEPARTURE, format='%Y-%m-%d %H:%M:%S')
-        df_delay_depture['SCHEDULED_DEPARTURE'] = pd.to_datetime(df_delay_depture.SCHEDULED_DEPARTURE, format='%H')
-        df_delay_depture['SCHEDULED_DEPARTURE'] = df_delay_depture['SCHEDULED_DEPARTURE'].dt.strftime('%H')
+        ##### Hub ranking #####
+        st.write("**Route Network**")
+        with profiler.span('route graph') as span:
+            route_graph, hub_ranking = load_route_graph(data_version, flight_store)
+            span.rows_out = route_graph.flights.nnz
+
+        col_graph_airports, col_graph_routes, col_graph_flights = st.columns(3)
+        col_graph_airports.metric(label='Airports', value=route_graph.n_airports)
+        col_graph_routes.metric(label='Routes', value=route_graph.flights.nnz)
+        col_graph_flights.metric(label='Flights', value=int(route_graph.flights.sum()))
+
+        hub_count = st.slider('Hubs shown', 5, 50, 15)
+        top_hubs = hub_ranking.head(hub_count)
+        fig_hubs = px.bar(top_hubs, x=top_hubs.index, y='PAGERANK', color='DELAY_PROPAGATION', height=400)
+        fig_hubs.update_layout(
+                title="Hub ranking by PageRank, coloured by delay propagation",
+                xaxis_title="Airport",
+                yaxis_title="PageRank",
+            )
+        profiler.render('st.plotly_chart fig_hubs', st.plotly_chart, fig_hubs, use_container_width=True)
+        profiler.render('st.dataframe hub ranking', st.dataframe, top_hubs, use_container_width=True)
+        ###### End ######
+
+        ##### Reachability #####
+        col_reach_from, col_reach_hops = st.columns([3, 1])
+        with col_reach_from:
+            selected_reach_airports = st.multiselect('Reachable from', list(route_graph.airports), default=list(hub_ranking.index[0:1]))
+        with col_reach_hops:
+            reach_hops = st.slider('Max hops', 1, graph.MAX_HOPS, 1)
+        with profiler.span('reachable airports') as span:
+            reachable_hops = route_graph.reachable(selected_reach_airports, reach_hops)
+            span.rows_out = len(reachable_hops)
+        hop_counts = reachable_hops.value_counts().sort_index()
+        for col_hop, hop in zip(st.columns(reach_hops + 1), range(reach_hops + 1)):
+            col_hop.metric(label='%d hop%s' % (hop, '' if hop == 1 else 's'), value=int(hop_counts.get(hop, 0)))
+        profiler.render('st.dataframe reachable', st.dataframe,
+                        hub_ranking.loc[reachable_hops.index].assign(HOPS=reachable_hops), use_container_width=True)
+        ###### End ######
+
+        ##########
+        df_delay_depture = analytics.early_departures(load_rows(data_version, ('ORIGIN_AIRPORT', 'DEPARTURE_HOUR', 'DEPARTURE_DELAY'), flight_store))
 
         def plot_dpt():
 
@@ -440,7 +630,7 @@ elif nav_menu == 'Query Analyzer':
 
             fig = go.Figure()
             for country, df in dfs.items():
-                fig = fig.add_trace(go.Scatter(x=df["SCHEDULED_DEPARTURE"], y=df["DEPARTURE_DELAY"], name=country, mode='markers', marker_size=df["DEPARTURE_DELAY"], 
+                fig = fig.add_trace(go.Scatter(x=df["DEPARTURE_HOUR"], y=df["DEPARTURE_DELAY"], name=country, mode='markers', marker_size=df["DEPARTURE_DELAY"], 
                                                hovertext=df['ORIGIN_AIRPORT']))
                 
                 fig.update_layout(
@@ -450,50 +640,93 @@ elif nav_menu == 'Query Analyzer':
                 legend_title="Airport",
             )
 
-            st.plotly_chart(fig, use_container_width=True)
+            profiler.render('st.plotly_chart fig', st.plotly_chart, fig, use_container_width=True)
 
 
         plot_dpt()
         ##########
             
     else:
-        st.dataframe(data)
+        profiler.render('st.dataframe raw page', st.dataframe, analytics.raw_page(flight_store, 1, rawdata.PAGE_SIZES[1]))
 
 ########### End of Query Analyzer ##########
 
 elif nav_menu == "Raw Data":
 
     # Data filtering options
+    raw_rows = None
     is_enable_filter = st.sidebar.checkbox('Enable filter')
     if is_enable_filter:
         select_one = st.sidebar.radio("Select any one",('Origin Airport', 'Destination Airport'))
         if select_one == 'Origin Airport':
-            options_origin = data['ORIGIN_AIRPORT'].unique().tolist()
+            options_origin = data_index['ORIGIN_AIRPORT'].values()
             selected_options_origin = st.sidebar.multiselect('Select Origin Airport',options_origin)
 
-            filtered_df_origin = data[data["ORIGIN_AIRPORT"].isin(selected_options_origin)]
-            st.dataframe(filtered_df_origin)
+            with profiler.span('filter rows', rows_in=flight_store.n_rows) as span:
+                raw_rows = data_index.select(ORIGIN_AIRPORT=selected_options_origin)
+                span.rows_out = len(raw_rows)
 
         if select_one == 'Destination Airport':
-            options_destination = data['DESTINATION_AIRPORT'].unique().tolist()
+            options_destination = data_index['DESTINATION_AIRPORT'].values()
             selected_options_destination = st.sidebar.multiselect('Select Destination Airport',options_destination)
 
-            filtered_df_destination = data[data["DESTINATION_AIRPORT"].isin(selected_options_destination)]
-            st.dataframe(filtered_df_destination)
-
+            with profiler.span('filter rows', rows_in=flight_store.n_rows) as span:
+                raw_rows = data_index.select(DESTINATION_AIRPORT=selected_options_destination)
+                span.rows_out = len(raw_rows)
     else:
         st.header("Raw data")
-        st.dataframe(data)
 
-        @st.cache_data
-        def convert_df(data):
-            return data.to_csv().encode('utf-8')
-        
-        csv = convert_df(data)
-
-        st.download_button(
-            label='Download Data',
-            data=csv,
-            file_name='raw.csv',
-            mime='text/csv',
-        )
+    ###### Paginated table: only the visible page is sent to the browser ######
+    n_raw_rows = flight_store.n_rows if raw_rows is None else len(raw_rows)
+    col_sort, col_order, col_page_size, col_page = st.columns(4)
+    with col_sort:
+        sort_column = st.selectbox('Sort by', ['(table order)'] + flight_store.columns)
+    with col_order:
+        sort_ascending = st.radio('Order', ('Ascending', 'Descending'), horizontal=True) == 'Ascending'
+    with col_page_size:
+        page_size = st.selectbox('Rows per page', rawdata.PAGE_SIZES, index=1)
+    with col_page:
+        page = st.number_input('Page', min_value=1, max_value=rawdata.page_count(n_raw_rows, page_size), value=1)
+
+    with profiler.span('sort keys', rows_in=flight_store.n_rows):
+        sort_ranks = None if sort_column == '(table order)' else load_sort_ranks(data_version, sort_column, sort_ascending, flight_store)
+    with profiler.span('raw page', rows_in=n_raw_rows) as span:
+        page_df = analytics.raw_page(flight_store, page, page_size, raw_rows, sort_ranks)
+        span.rows_out = len(page_df)
+    profiler.render('st.dataframe raw page', st.dataframe, page_df)
+    st.caption('%d rows, page %d of %d' % (n_raw_rows, page, rawdata.page_count(n_raw_rows, page_size)))
+    ###### End ######
+
+    if not is_enable_filter and flight_store.memory_report is not None:
+        with st.expander("Memory usage per column (bytes)"):
+            profiler.render('st.dataframe memory report', st.dataframe, flight_store.memory_report, use_container_width=True)
+
+    ###### Export of the table or of the filtered rows, written to disk in chunks ######
+    col_export_format, col_export = st.columns([1, 3])
+    with col_export_format:
+        export_format = st.radio('Export format', list(rawdata.EXPORT_FORMATS), horizontal=True)
+    extension, mime = rawdata.EXPORT_FORMATS[export_format]
+    with col_export:
+        if st.button('Prepare download'):
+            with profiler.span('export', rows_in=n_raw_rows):
+                export_path = rawdata.temporary_export(flight_store, export_format, raw_rows)
+            # The download button keeps the bytes, so the file is not needed past this rerun
+            try:
+                with open(export_path, 'rb') as export_file:
+                    st.download_button(
+                        label='Download Data',
+                        data=export_file,
+                        file_name='raw.' + extension,
+                        mime=mime,
+                    )
+            finally:
+                os.remove(export_path)
+    ###### End ######
+
+########### Performance debug panel ##########
+
+profiler.write_log()
+if is_debug_panel:
+    with st.sidebar.expander('Performance (this rerun)', expanded=True):
+        st.write('Page: %s, total %.1f ms' % (nav_menu, profiler.total_ms()))
+        st.dataframe(profiler.to_dataframe(), use_container_width=True)
@@ -0,0 +1 @@
+"""Benchmarks of the app's page compute paths over synthetic flights."""
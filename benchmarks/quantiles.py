@@ -0,0 +1,86 @@
+"""Check the delay quantile sketches against exact quantiles.
+
+    python -m benchmarks.quantiles [--rows 200000] [--selections 200] [--chunks 4]
+
+Synthetic flights are sketched in ``--chunks`` chunks that are merged, as
+the store builder does. For random airline, airport and hour selections the
+sketched p50/p90/p99 are compared with numpy's 'lower' quantiles of the
+selected delays; every error must stay within the bound documented in
+:mod:`flights.sketch`. The run exits with status 1 when one does not.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import synthetic_flights
+from flights import sketch
+
+# Slack for floating point rounding at bin edges
+TOLERANCE = 1e-9
+
+
+def within_bound(estimate, exact):
+    if abs(exact) < sketch.MIN_VALUE:
+        return abs(estimate - exact) <= sketch.MIN_VALUE
+    return abs(estimate - exact) <= (sketch.ALPHA + TOLERANCE) * abs(exact)
+
+
+def random_selection(rng, df, airport):
+    selection = {}
+    for name, column in (('airlines', 'AIRLINE'), ('airports', airport)):
+        values = df[column].cat.categories
+        size = rng.integers(0, 4)
+        selection[name] = list(rng.choice(values, size=size, replace=False)) if size else None
+    hours = rng.integers(0, 24, size=rng.integers(0, 6))
+    selection['hours'] = [int(hour) for hour in hours] if len(hours) else None
+    return selection
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--selections', type=int, default=200)
+    parser.add_argument('--chunks', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    df = synthetic_flights(args.rows, args.seed)
+    bounds = np.linspace(0, len(df), args.chunks + 1).astype(int)
+    sketches = sketch.DelaySketches.combine([
+        sketch.DelaySketches.from_frame(df.iloc[start:end]) for start, end in zip(bounds[:-1], bounds[1:])
+    ])
+
+    rng = np.random.default_rng(args.seed)
+    worst, failures, checked, elapsed = 0.0, 0, 0, 0.0
+    for measure, (airport, hour) in sketch.SKETCHED.items():
+        for _ in range(args.selections):
+            selection = random_selection(rng, df, airport)
+            mask = df[measure].notna().to_numpy()
+            for column, values in (('AIRLINE', selection['airlines']), (airport, selection['airports']),
+                                   (hour, selection['hours'])):
+                if values:
+                    mask = mask & df[column].isin(values).to_numpy()
+            delays = df[measure].to_numpy(dtype=np.float64)[mask]
+            start = time.perf_counter()
+            estimates = sketches.quantiles(measure, **selection)
+            elapsed += time.perf_counter() - start
+            if not len(delays):
+                continue
+            for percentile, estimate in estimates.items():
+                exact = float(np.quantile(delays, percentile / 100, method='lower'))
+                checked += 1
+                if abs(exact) >= sketch.MIN_VALUE:
+                    worst = max(worst, abs(estimate - exact) / abs(exact))
+                if not within_bound(estimate, exact):
+                    failures += 1
+                    print('OUT OF BOUND %s p%d %s: sketch %.4f, exact %.4f' % (
+                        measure, percentile, selection, estimate, exact))
+
+    print('%d quantiles checked, worst relative error %.5f (bound %.5f), %.3f ms per query' % (
+        checked, worst, sketch.ALPHA, elapsed * 1000 / (args.selections * len(sketch.SKETCHED))))
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""Time each page's compute path over synthetic flights.
+
+    python -m benchmarks.run --sizes 10k,1m [--save-baseline] [--threshold 1.25]
+
+For every size and path the best wall time over ``--repeat`` runs, the
+throughput in rows per second and the peak traced memory are reported.
+Times are compared with ``benchmarks/baseline.json`` when it holds an entry
+for the same size and path; the run exits with status 1 when a path is
+slower than its baseline by more than ``--threshold`` times (and by more
+than MIN_REGRESSION_SECONDS).
+
+Timings depend on the machine, so no baseline is shipped. Record one on the
+machine that runs the check, from the commit to compare against, with the
+same sizes the check will use:
+
+    git checkout <reference commit>
+    python -m benchmarks.run --sizes 10k,1m --save-baseline
+    git checkout -
+    python -m benchmarks.run --sizes 10k,1m
+
+Without a baseline file nothing can be compared: the run says so and exits
+with status 2. Paths or sizes missing from the baseline are listed and not
+checked.
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.synthetic import synthetic_flights
+from flights import analytics, explore, facts, graph, rawdata, routes, spatial, store, table
+
+SIZES = {'10k': 10_000, '1m': 1_000_000, '10m': 10_000_000}
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+# Differences below this many seconds are timer noise, not regressions
+MIN_REGRESSION_SECONDS = 0.005
+
+
+def load_path(raw):
+    return store.FlightStore.from_frame('bench', table.compact_frame(raw))
+
+
+def dashboard_path(flight_store, scatter_df, extent):
+    analytics.dashboard_kpis(flight_store.cube)
+    analytics.airline_frequency(flight_store.cube)
+    flight_store.hour_counts
+    flight_store.mean_hour_delays('departure_airline')
+    analytics.scatter_view(scatter_df, *extent)
+
+
+def map_analyzer_path(flight_store):
+    analytics.map_payload(flight_store.routes, 'All routes')
+    analytics.frequency_tables(flight_store.cube)
+
+
+def matrix_path(delay_facts):
+    for column, measure in [('ORIGIN_AIRPORT', 'Departure Delay'), ('DESTINATION_AIRPORT', 'Destination Delay'),
+                            ('AIRLINE', 'ELAPSED_TIME')]:
+        selected = delay_facts.options(column)[:3]
+        analytics.delay_metrics(delay_facts, column, selected, measure)
+        delay_facts.delay_bars('AIRLINE' if column != 'AIRLINE' else 'ORIGIN_AIRPORT', 'p95', **{column: selected[:1]})
+
+
+def geo_map_path(flight_store, spatial_index):
+    for column in ('ORIGIN_AIRPORT', 'AIRLINE'):
+        selected = flight_store.index[column].values()[:3]
+        filtered = analytics.geo_rows(flight_store, flight_store.index, **{column: selected})
+        route_df = routes.route_payload(filtered)
+        spatial_index.arcs_in_view(route_df, 25.0, -125.0, 50.0, -65.0)
+        analytics.geo_metrics(filtered)
+    near_airports = spatial_index.near(39.0, -95.0, 500)
+    routes.route_payload(analytics.geo_rows_near(flight_store, flight_store.index, near_airports))
+
+
+def explore_path(explore_table):
+    low, high = explore_table.value_range('DEPARTURE_DELAY')
+    explore_table.filter({'AIRLINE': explore_table.values('AIRLINE')[:2], 'DEPARTURE_DELAY': (low / 2, high / 2)},
+                         columns=['AIRLINE', 'ORIGIN_AIRPORT', 'DEPARTURE_DELAY'])
+
+
+def graph_path(flight_store):
+    route_graph = graph.RouteGraph.from_routes(flight_store.routes)
+    hub_ranking = route_graph.hub_ranking()
+    route_graph.reachable(hub_ranking.index[:1], graph.MAX_HOPS)
+
+
+def raw_data_path(flight_store, export_dir):
+    ranks = rawdata.sort_ranks(flight_store.frame(['DEPARTURE_DELAY'])['DEPARTURE_DELAY'], ascending=False)
+    analytics.raw_page(flight_store, 3, 100, ranks=ranks)
+    rows = flight_store.index.select(ORIGIN_AIRPORT=flight_store.index['ORIGIN_AIRPORT'].values()[:1])
+    analytics.raw_page(flight_store, 1, 100, rows=rows, ranks=ranks)
+    rawdata.export(flight_store, os.path.join(export_dir, 'filtered.parquet'), 'Parquet', rows)
+
+
+def measure(fn, repeat):
+    """Best wall time over ``repeat`` runs and peak traced bytes of the first."""
+    best = None
+    peak = 0
+    for attempt in range(repeat):
+        if attempt == 0:
+            tracemalloc.start()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        if attempt == 0:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        best = elapsed if best is None else min(best, elapsed)
+    return best, peak
+
+
+def run_size(label, n_rows, repeat):
+    raw = synthetic_flights(n_rows)
+    flight_store = load_path(raw)
+    scatter_df = flight_store.frame(analytics.SCATTER_COLUMNS)
+    extent = ((0.0, float(scatter_df['DISTANCE'].max())), (0.0, float(scatter_df['ELAPSED_TIME'].max())))
+    export_dir = tempfile.mkdtemp(prefix='flights-bench-')
+    delay_facts = facts.DelayFacts.from_store(flight_store)
+    explore_table = explore.ExploreTable.from_frame(flight_store.frame(analytics.EXPLORE_COLUMNS))
+    spatial_index = spatial.SpatialIndex.from_routes(flight_store.routes)
+    paths = {
+        'load': lambda: load_path(raw),
+        'dashboard': lambda: dashboard_path(flight_store, scatter_df, extent),
+        'map_analyzer': lambda: map_analyzer_path(flight_store),
+        'matrix': lambda: matrix_path(delay_facts),
+        'geo_map': lambda: geo_map_path(flight_store, spatial_index),
+        'explore': lambda: explore_path(explore_table),
+        'graph': lambda: graph_path(flight_store),
+        'raw_data': lambda: raw_data_path(flight_store, export_dir),
+    }
+    results = {}
+    try:
+        for name, fn in paths.items():
+            seconds, peak = measure(fn, repeat)
+            results[name] = {'rows': n_rows, 'seconds': seconds, 'rows_per_s': n_rows / seconds,
+                             'peak_mb': peak / 2 ** 20}
+            print('%-5s %-13s %9.4f s %14.0f rows/s %9.1f MB peak' % (
+                label, name, seconds, n_rows / seconds, peak / 2 ** 20), flush=True)
+    finally:
+        shutil.rmtree(export_dir, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', default='10k,1m', help='comma separated, from %s' % ','.join(SIZES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='fail when a path takes more than this times its baseline')
+    args = parser.parse_args()
+
+    results = {}
+    for label in args.sizes.split(','):
+        results[label] = run_size(label, SIZES[label], args.repeat)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print('baseline written to %s' % args.baseline)
+        return
+
+    if not os.path.exists(args.baseline):
+        print('NO BASELINE at %s, regression check skipped; record one with --save-baseline' % args.baseline)
+        raise SystemExit(2)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = []
+    for label, paths in results.items():
+        for name, result in paths.items():
+            expected = baseline.get(label, {}).get(name)
+            if not expected:
+                print('no baseline for %s %s, not checked' % (label, name))
+            elif (result['seconds'] > expected['seconds'] * args.threshold
+                    and result['seconds'] - expected['seconds'] > MIN_REGRESSION_SECONDS):
+                regressions.append('%s %s: %.4f s, baseline %.4f s' % (
+                    label, name, result['seconds'], expected['seconds']))
+    for regression in regressions:
+        print('REGRESSION ' + regression)
+    raise SystemExit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Synthetic flights with the schema of the flights dataset.
+
+Airport codes, coordinates and airline codes come from Faker; the flights
+themselves are drawn with NumPy so that 10M rows take seconds, not hours.
+Origins and destinations follow a hub-heavy Zipf-like popularity, distances
+follow the airport coordinates and delays are noisy around a few minutes.
+The frame is returned already compact (see :func:`flights.table.compact_frame`).
+"""
+import string
+
+import numpy as np
+import pandas as pd
+from faker import Faker
+
+N_AIRPORTS = 300
+N_AIRLINES = 14
+START = np.datetime64('2015-01-01T00:00:00')
+DAYS = 31
+
+
+def vocabulary(seed=0):
+    """Airport codes with coordinates, and airline codes."""
+    fake = Faker('en_US')
+    Faker.seed(seed)
+    airports = [fake.unique.lexify('???', letters=string.ascii_uppercase) for _ in range(N_AIRPORTS)]
+    places = [fake.local_latlng(country_code='US') for _ in range(N_AIRPORTS)]
+    lat = np.array([float(place[0]) for place in places], dtype=np.float32)
+    lon = np.array([float(place[1]) for place in places], dtype=np.float32)
+    airlines = sorted({fake.unique.lexify('??', letters=string.ascii_uppercase) for _ in range(N_AIRLINES)})
+    return airports, lat, lon, airlines
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * np.arcsin(np.sqrt(a))
+
+
+def synthetic_flights(n_rows, seed=0):
+    """A compact flights frame of ``n_rows`` rows."""
+    airports, lat, lon, airlines = vocabulary(seed)
+    rng = np.random.default_rng(seed)
+    popularity = 1.0 / np.arange(1, N_AIRPORTS + 1) ** 0.8
+    popularity /= popularity.sum()
+
+    origin = rng.choice(N_AIRPORTS, size=n_rows, p=popularity).astype(np.int16)
+    destination = rng.choice(N_AIRPORTS, size=n_rows, p=popularity).astype(np.int16)
+    same = origin == destination
+    destination[same] = (destination[same] + 1) % N_AIRPORTS
+    airline = rng.integers(0, len(airlines), size=n_rows, dtype=np.int8)
+
+    distance = (haversine_km(lat[origin], lon[origin], lat[destination], lon[destination]) * 0.621).astype(np.float32)
+    scheduled_time = (30 + distance / 8 + rng.normal(0, 5, n_rows)).astype(np.float32)
+    elapsed_time = (scheduled_time + rng.normal(-2, 10, n_rows)).astype(np.float32)
+    departure_delay = rng.normal(5, 25, n_rows).astype(np.float32)
+    destination_delay = (departure_delay + rng.normal(-3, 10, n_rows)).astype(np.float32)
+    departure_delay[rng.random(n_rows) < 0.01] = np.nan
+    destination_delay[rng.random(n_rows) < 0.01] = np.nan
+
+    departure = START + rng.integers(0, DAYS * 86400, size=n_rows).astype('timedelta64[s]')
+    arrival = departure + (scheduled_time.astype(np.int64) * 60).astype('timedelta64[s]')
+    departure_hour = ((departure - START).astype(np.int64) // 3600 % 24).astype(np.int8)
+    arrival_hour = ((arrival - START).astype(np.int64) // 3600 % 24).astype(np.int8)
+
+    return pd.DataFrame({
+        'AIRLINE': pd.Categorical.from_codes(airline, airlines),
+        'FLIGHT_NUMBER': rng.integers(1, 7000, size=n_rows, dtype=np.int16),
+        'ORIGIN_AIRPORT': pd.Categorical.from_codes(origin, airports),
+        'DESTINATION_AIRPORT': pd.Categorical.from_codes(destination, airports),
+        'SCHEDULED_DEPARTURE': departure,
+        'DEPARTURE_HOUR': departure_hour,
+        'SCHEDULED_TIME': scheduled_time,
+        'ELAPSED_TIME': elapsed_time,
+        'DISTANCE': distance,
+        'DEPARTURE_DELAY': departure_delay,
+        'DESTINATION_DELAY': destination_delay,
+        'ORIGIN_AIRPORT_LAT': lat[origin],
+        'ORIGIN_AIRPORT_LON': lon[origin],
+        'DESTINATION_AIRPORT_LAT': lat[destination],
+        'DESTINATION_AIRPORT_LON': lon[destination],
+        'SCHEDULED_DESTINATION': arrival,
+        'DESTINATION_HOUR': arrival_hour,
+    })
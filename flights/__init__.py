@@ -0,0 +1 @@
+"""Data layer behind the East Berlin Airlines Streamlit app."""
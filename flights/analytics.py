@@ -0,0 +1,106 @@
+"""Compute paths of the app's pages, importable without Streamlit.
+
+Each function takes the store (or frames read from it) and returns plain
+frames, series and numbers; ``app.py`` only lays them out. The benchmark
+suite in ``benchmarks/`` times the same functions.
+"""
+import numpy as np
+
+from flights import density, rawdata, routes, sketch
+
+QUERY_COLUMNS = [
+    'AIRLINE', 'ORIGIN_AIRPORT', 'DESTINATION_AIRPORT', 'SCHEDULED_TIME', 'ELAPSED_TIME',
+    'DEPARTURE_DELAY', 'DESTINATION_DELAY', 'ORIGIN_AIRPORT_LAT', 'ORIGIN_AIRPORT_LON',
+    'DESTINATION_AIRPORT_LAT', 'DESTINATION_AIRPORT_LON',
+]
+EXPLORE_COLUMNS = QUERY_COLUMNS[:7]
+SCATTER_COLUMNS = ['AIRLINE', 'ORIGIN_AIRPORT', 'DESTINATION_AIRPORT', 'FLIGHT_NUMBER', 'DISTANCE', 'ELAPSED_TIME']
+
+
+########### Dashboard ##########
+
+def dashboard_kpis(cube):
+    """Values of the four Dashboard metric tiles."""
+    return {
+        'flights': cube.total_flights(),
+        'mean_departure_delay': round(cube.mean('DEPARTURE_DELAY'), 2),
+        'top_airline': cube.top('AIRLINE'),
+        'busiest_airport': cube.top('DESTINATION_AIRPORT'),
+    }
+
+
+def airline_frequency(cube):
+    """Flights per airline, by airline code, for the Dashboard bar chart."""
+    return cube.counts('AIRLINE').sort_index().to_frame()
+
+
+def scatter_view(scatter_df, x_range, y_range):
+    """``('points', rows)`` when few enough flights are in view, else ``('density', grid)``."""
+    visible = density.in_view(scatter_df, 'DISTANCE', 'ELAPSED_TIME', x_range, y_range)
+    if visible.sum() <= density.POINT_LIMIT:
+        return 'points', scatter_df[visible]
+    return 'density', density.density_grid(scatter_df, 'DISTANCE', 'ELAPSED_TIME', 'AIRLINE', x_range, y_range)
+
+
+########### Map Analyzer ##########
+
+def map_payload(route_table, detail):
+    """Styled routes of a precomputed route table at a DETAIL_LEVELS level."""
+    return routes.style_routes(routes.limit_routes(route_table, min_flights=routes.DETAIL_LEVELS[detail]))
+
+
+def frequency_tables(cube):
+    """Flights per airline, origin airport and destination airport."""
+    return [cube.counts(name) for name in ('AIRLINE', 'ORIGIN_AIRPORT', 'DESTINATION_AIRPORT')]
+
+
+########### Query Analyzer ##########
+
+def delay_metrics(delay_facts, key, values, measure):
+    """'Total Flight' and 'Total delay' of the Matrix view for the selected ``key`` values."""
+    return delay_facts.metric(key, values, measure)
+
+
+def delay_percentiles(sketches, airlines=None, airports=None, hours=None):
+    """p50/p90/p99 departure and arrival delays of the selection, merged from the store's sketches."""
+    return {
+        measure: sketches.quantiles(measure, airlines=airlines, airports=airports, hours=hours)
+        for measure in sketch.SKETCHED
+    }
+
+
+def geo_rows(store, index, **filters):
+    """Query columns of the flights matching the GEO Map Matrix filters."""
+    return store.take(index.select(**filters), QUERY_COLUMNS)
+
+
+def geo_rows_near(store, index, airports):
+    """Query columns of the flights departing from or arriving at ``airports``."""
+    rows = np.union1d(index['ORIGIN_AIRPORT'].lookup(airports), index['DESTINATION_AIRPORT'].lookup(airports))
+    return store.take(rows, QUERY_COLUMNS)
+
+
+def geo_metrics(filtered, absolute_destination_delay=False):
+    """Flights, elapsed time and delay totals shown next to the GEO maps."""
+    destination_delay = filtered['DESTINATION_DELAY']
+    if absolute_destination_delay:
+        destination_delay = destination_delay.abs()
+    return {
+        'flights': len(filtered),
+        'elapsed_time': filtered['ELAPSED_TIME'].sum(),
+        'departure_delay': filtered['DEPARTURE_DELAY'].sum(),
+        'destination_delay': destination_delay.sum(),
+    }
+
+
+def early_departures(frame):
+    """Early departures with the departure hour and delay in minutes, for Graph Analytics."""
+    rows = frame.loc[frame['DEPARTURE_DELAY'] < 0, ['ORIGIN_AIRPORT', 'DEPARTURE_HOUR', 'DEPARTURE_DELAY']]
+    return rows.assign(DEPARTURE_DELAY=rows['DEPARTURE_DELAY'].abs())
+
+
+########### Raw Data ##########
+
+def raw_page(store, page, page_size, rows=None, ranks=None):
+    """One page of raw rows, read from the store."""
+    return store.take(rawdata.page_rows(store.n_rows, page, page_size, rows, ranks))
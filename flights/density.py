@@ -0,0 +1,52 @@
+"""Server-side binning for the 'Elapsed Time vs Distance' scatter.
+
+Large selections are drawn as a grid of per-airline bin counts, whose size
+depends on the number of bins rather than the number of flights. Points are
+only drawn once the visible region holds at most POINT_LIMIT flights.
+"""
+import numpy as np
+import pandas as pd
+
+POINT_LIMIT = 5000
+BINS = 60
+
+
+def extent(column):
+    """(min, max) of a numeric column, ignoring missing values."""
+    values = column.to_numpy(dtype=np.float64, na_value=np.nan)
+    return float(np.nanmin(values)), float(np.nanmax(values))
+
+
+def in_view(df, x, y, x_range, y_range):
+    """Boolean mask of the rows whose (x, y) falls inside both ranges."""
+    xs = df[x].to_numpy()
+    ys = df[y].to_numpy()
+    return (xs >= x_range[0]) & (xs <= x_range[1]) & (ys >= y_range[0]) & (ys <= y_range[1])
+
+
+def density_grid(df, x, y, group, x_range, y_range, bins=BINS):
+    """Flights per ``group`` x ``x`` bin x ``y`` bin inside the given ranges.
+
+    Returns one row per non-empty cell with the group value, the bin edges
+    (``x_start``, ``x_end``, ``y_start``, ``y_end``) and ``count``.
+    """
+    mask = in_view(df, x, y, x_range, y_range)
+    codes, groups = pd.factorize(df[group])
+    mask &= codes >= 0
+    x_step = (x_range[1] - x_range[0]) / bins or 1.0
+    y_step = (y_range[1] - y_range[0]) / bins or 1.0
+    xi = np.minimum(((df[x].to_numpy()[mask] - x_range[0]) / x_step).astype(np.int64), bins - 1)
+    yi = np.minimum(((df[y].to_numpy()[mask] - y_range[0]) / y_step).astype(np.int64), bins - 1)
+    flat = (codes[mask].astype(np.int64) * bins + xi) * bins + yi
+    counts = np.bincount(flat, minlength=len(groups) * bins * bins)
+    cells = np.flatnonzero(counts)
+    group_code, rest = np.divmod(cells, bins * bins)
+    x_bin, y_bin = np.divmod(rest, bins)
+    return pd.DataFrame({
+        group: np.asarray(groups)[group_code],
+        'x_start': x_range[0] + x_bin * x_step,
+        'x_end': x_range[0] + (x_bin + 1) * x_step,
+        'y_start': y_range[0] + y_bin * y_step,
+        'y_end': y_range[0] + (y_bin + 1) * y_step,
+        'count': counts[cells],
+    })
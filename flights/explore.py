@@ -0,0 +1,83 @@
+"""Arrow-backed filtering for the Query Analyzer 'Advance Data Explore' view.
+
+An :class:`ExploreTable` holds the explore columns of one dataset version
+as a pyarrow table, shared by all sessions. Filters are evaluated with
+``pyarrow.compute`` into one boolean mask, and only the selected columns of
+the first ROW_LIMIT matching rows are taken out of the table; without
+filters the result is a zero-copy slice.
+
+Columns are filtered like ``dataframe_explorer`` does: dictionary columns
+and columns with fewer than CATEGORY_LIMIT distinct values by value,
+numeric columns by range and other columns by a pattern.
+"""
+import pyarrow as pa
+import pyarrow.compute as pc
+
+ROW_LIMIT = 10_000
+CATEGORY_LIMIT = 10
+
+
+def column_kind(column):
+    """'category', 'range' or 'text': how ``column`` is filtered."""
+    if pa.types.is_dictionary(column.type) or pc.count_distinct(column).as_py() < CATEGORY_LIMIT:
+        return 'category'
+    if pa.types.is_integer(column.type) or pa.types.is_floating(column.type):
+        return 'range'
+    return 'text'
+
+
+def column_mask(column, kind, value, case=False):
+    """Boolean mask of the rows of ``column`` passing one filter; nulls never pass."""
+    if kind == 'category':
+        return pc.is_in(column, value_set=pa.array(list(value), type=column.type.value_type
+                                                   if pa.types.is_dictionary(column.type) else column.type))
+    if kind == 'range':
+        low, high = value
+        return pc.and_(pc.greater_equal(column, low), pc.less_equal(column, high))
+    return pc.match_substring_regex(column, value, ignore_case=not case)
+
+
+class ExploreTable:
+
+    def __init__(self, table):
+        self.table = table
+        self.kinds = {name: column_kind(table.column(name)) for name in table.column_names}
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(pa.Table.from_pandas(df, preserve_index=False))
+
+    @property
+    def columns(self):
+        return self.table.column_names
+
+    def values(self, name):
+        """Distinct non-null values of ``name``, in order of first appearance."""
+        values = self.table.column(name).unique()
+        if pa.types.is_dictionary(values.type):
+            values = values.dictionary_decode()
+        return [value for value in values.to_pylist() if value is not None]
+
+    def value_range(self, name):
+        bounds = pc.min_max(self.table.column(name))
+        return float(bounds['min'].as_py()), float(bounds['max'].as_py())
+
+    def filter(self, filters, columns=None, limit=ROW_LIMIT, case=False):
+        """First ``limit`` rows passing all ``filters``, and the number of rows passing.
+
+        ``filters`` maps column names to the selected values, ``(low, high)``
+        bounds or pattern, depending on the column kind; empty patterns are
+        ignored. Only ``columns`` are taken out of the table.
+        """
+        projected = self.table if columns is None else self.table.select(list(columns))
+        mask = None
+        for name, value in filters.items():
+            kind = self.kinds[name]
+            if kind == 'text' and not value:
+                continue
+            column_filter = column_mask(self.table.column(name), kind, value, case)
+            mask = column_filter if mask is None else pc.and_(mask, column_filter)
+        if mask is None:
+            return projected.slice(0, limit), self.table.num_rows
+        rows = pc.indices_nonzero(mask)
+        return projected.take(rows.slice(0, limit)), len(rows)
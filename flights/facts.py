@@ -0,0 +1,103 @@
+"""Delay facts of the Query Analyzer 'Matrix' view.
+
+The facts are the flights that were early on both departure and arrival,
+with the absolute delays in 'Departure Delay' and 'Destination Delay'. Per
+origin, destination and airline the store keeps the number of these
+flights and the sums of the measures, computed per chunk and merged like
+its other aggregates. The Matrix metrics add up the entries of the
+selected keys, so they cost time in proportion to the selection rather
+than to the table; only the bar charts read fact rows, through the store
+indexes, for the keys they show.
+"""
+import pandas as pd
+
+KEYS = ['ORIGIN_AIRPORT', 'DESTINATION_AIRPORT', 'AIRLINE']
+MEASURES = ['Departure Delay', 'Destination Delay', 'ELAPSED_TIME']
+DELAYS = MEASURES[:2]
+# Bar values of the Matrix charts, by label
+BAR_STATISTICS = {'Sum': 'sum', 'Mean': 'mean', 'P95': 'p95'}
+# Store columns the fact rows are made of
+FACT_COLUMNS = [
+    'AIRLINE', 'ORIGIN_AIRPORT', 'DESTINATION_AIRPORT', 'ELAPSED_TIME', 'DEPARTURE_DELAY', 'DESTINATION_DELAY',
+    'ORIGIN_AIRPORT_LAT', 'ORIGIN_AIRPORT_LON', 'DESTINATION_AIRPORT_LAT', 'DESTINATION_AIRPORT_LON',
+]
+
+
+def delay_table(default_df):
+    """Flights early on both departure and arrival, with their delays as minutes.
+
+    Rows keep their position in ``default_df`` as index.
+    """
+    early = (default_df['DEPARTURE_DELAY'] < 0) & (default_df['DESTINATION_DELAY'] < 0)
+    rows = default_df[early]
+    return pd.DataFrame({
+        'AIRLINE': rows['AIRLINE'],
+        'ORIGIN_AIRPORT': rows['ORIGIN_AIRPORT'],
+        'Departure Delay': rows['DEPARTURE_DELAY'].abs(),
+        'DESTINATION_AIRPORT': rows['DESTINATION_AIRPORT'],
+        'Destination Delay': rows['DESTINATION_DELAY'].abs(),
+        'ELAPSED_TIME': rows['ELAPSED_TIME'],
+        'ORIGIN_AIRPORT_LAT': rows['ORIGIN_AIRPORT_LAT'],
+        'ORIGIN_AIRPORT_LON': rows['ORIGIN_AIRPORT_LON'],
+        'DESTINATION_AIRPORT_LAT': rows['DESTINATION_AIRPORT_LAT'],
+        'DESTINATION_AIRPORT_LON': rows['DESTINATION_AIRPORT_LON'],
+    })
+
+
+def key_totals(table, key):
+    """Flights and measure sums per value of ``key``."""
+    frame = table[[key] + MEASURES].astype({measure: 'float64' for measure in MEASURES})
+    totals = frame.groupby(key, observed=True, sort=False).agg(
+        flights=(key, 'size'), **{measure: (measure, 'sum') for measure in MEASURES})
+    totals.index = totals.index.astype(object)
+    return totals
+
+
+def fact_totals(df):
+    """:func:`key_totals` of the fact rows of ``df`` for each of KEYS."""
+    table = delay_table(df)
+    return {key: key_totals(table, key) for key in KEYS}
+
+
+def merge_totals(*parts):
+    """Add up :func:`fact_totals` of disjoint sets of flights, keeping first appearance order."""
+    if len(parts) == 1:
+        return parts[0]
+    return {key: pd.concat([part[key] for part in parts]).groupby(level=0, sort=False).sum() for key in KEYS}
+
+
+class DelayFacts:
+
+    def __init__(self, store, totals):
+        self.store = store
+        self.totals = totals
+
+    @classmethod
+    def from_store(cls, store):
+        return cls(store, store.fact_totals)
+
+    @property
+    def n_rows(self):
+        return int(self.totals['AIRLINE']['flights'].sum())
+
+    def options(self, key):
+        """Values of ``key`` among the facts, in order of first appearance."""
+        return list(self.totals[key].index)
+
+    def rows(self, **filters):
+        """Fact rows matching the ``key=values`` filters, read from the store."""
+        rows = self.store.index.select(**filters)
+        return delay_table(self.store.take(rows, FACT_COLUMNS))
+
+    def metric(self, key, values, measure):
+        """Number of flights and the sum of ``measure`` over the selected ``key`` values."""
+        totals = self.totals[key]
+        selected = totals.loc[totals.index.intersection(pd.Index(list(values), dtype=object))]
+        return int(selected['flights'].sum()), float(selected[measure].sum())
+
+    def delay_bars(self, category, statistic, **filters):
+        """One row per ``category`` value with the ``statistic`` of both delays of the matching rows."""
+        rows = self.rows(**filters)[[category] + DELAYS].astype({delay: 'float64' for delay in DELAYS})
+        grouped = rows.groupby(category, observed=True, sort=False)
+        bars = grouped.quantile(0.95) if statistic == 'p95' else grouped.agg(statistic)
+        return bars.reset_index()
@@ -0,0 +1,125 @@
+"""Sparse origin -> destination route graph for the 'Graph Analytics' view.
+
+A :class:`RouteGraph` is built once per dataset version from the store's
+route table. Airports are the nodes; the CSR matrix ``flights`` holds the
+number of flights of every route and ``late_minutes`` the arrival delay
+minutes its flights add up to when the route is late on average. Rankings
+and reachability are sparse matrix-vector products over these matrices, so
+they cost time in the number of routes, not flights.
+
+- Degree: number of distinct destinations (out) and origins (in), and the
+  flights leaving and arriving.
+- PageRank: stationary visit share of a random walk that follows routes in
+  proportion to their flights and jumps to a random airport with
+  probability 1 - DAMPING; airports without departures jump uniformly.
+- Reachability: fewest hops from a set of airports to every airport within
+  ``k`` hops.
+- Delay propagation: late arrival minutes of an airport's departures, plus
+  PROPAGATION_DECAY times the propagation scores of its destinations,
+  weighted by their share of its flights, up to PROPAGATION_HOPS hops.
+"""
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from flights.routes import ROUTE_KEYS
+
+DAMPING = 0.85
+PAGERANK_TOLERANCE = 1e-10
+PAGERANK_ITERATIONS = 100
+PROPAGATION_DECAY = 0.5
+PROPAGATION_HOPS = 3
+MAX_HOPS = 4
+
+
+class RouteGraph:
+
+    def __init__(self, airports, flights, late_minutes):
+        self.airports = airports
+        self.flights = flights
+        self.late_minutes = late_minutes
+        self.reverse = flights.T.tocsr()
+
+    @classmethod
+    def from_routes(cls, route_table):
+        keys = [route_table[key].astype(str) for key in ROUTE_KEYS]
+        airports = pd.Index(pd.unique(np.concatenate([key.to_numpy() for key in keys])))
+        origin, destination = (airports.get_indexer(key) for key in keys)
+        n = len(airports)
+        flights = route_table['FLIGHTS'].to_numpy(dtype=np.float64)
+        late = np.nan_to_num(route_table['DESTINATION_DELAY_MEAN'].to_numpy(dtype=np.float64)).clip(0) * flights
+        return cls(
+            airports,
+            sparse.csr_matrix((flights, (origin, destination)), shape=(n, n)),
+            sparse.csr_matrix((late, (origin, destination)), shape=(n, n)),
+        )
+
+    @property
+    def n_airports(self):
+        return len(self.airports)
+
+    def degrees(self):
+        """Destinations, origins, departing and arriving flights of every airport."""
+        return pd.DataFrame({
+            'DESTINATIONS': np.diff(self.flights.indptr),
+            'ORIGINS': np.diff(self.reverse.indptr),
+            'DEPARTURES': np.asarray(self.flights.sum(axis=1)).ravel(),
+            'ARRIVALS': np.asarray(self.reverse.sum(axis=1)).ravel(),
+        }, index=self.airports)
+
+    def transitions(self):
+        """Row-stochastic matrix of the share of each airport's flights per destination."""
+        departures = np.asarray(self.flights.sum(axis=1)).ravel()
+        inverse = np.divide(1.0, departures, out=np.zeros_like(departures), where=departures > 0)
+        return sparse.diags(inverse) @ self.flights, departures > 0
+
+    def pagerank(self, damping=DAMPING, tolerance=PAGERANK_TOLERANCE, iterations=PAGERANK_ITERATIONS):
+        """Flight-weighted PageRank of every airport, summing to 1."""
+        n = self.n_airports
+        if not n:
+            return pd.Series(dtype=np.float64)
+        transitions, departs = self.transitions()
+        backward = transitions.T.tocsr()
+        rank = np.full(n, 1.0 / n)
+        for _ in range(iterations):
+            dangling = rank[~departs].sum()
+            updated = damping * (backward @ rank + dangling / n) + (1 - damping) / n
+            done = np.abs(updated - rank).sum() < tolerance
+            rank = updated
+            if done:
+                break
+        return pd.Series(rank, index=self.airports)
+
+    def reachable(self, sources, k=MAX_HOPS):
+        """Fewest hops from ``sources`` to every airport reachable within ``k`` hops (sources at 0)."""
+        hops = np.full(self.n_airports, -1)
+        frontier = np.zeros(self.n_airports, dtype=np.float64)
+        start = self.airports.get_indexer(list(sources))
+        frontier[start[start >= 0]] = 1.0
+        hops[frontier > 0] = 0
+        for hop in range(1, k + 1):
+            arrived = (self.reverse @ frontier) > 0
+            new = arrived & (hops < 0)
+            if not new.any():
+                break
+            hops[new] = hop
+            frontier = new.astype(np.float64)
+        reached = hops >= 0
+        return pd.Series(hops[reached], index=self.airports[reached]).sort_values(kind='stable')
+
+    def delay_propagation(self, decay=PROPAGATION_DECAY, hops=PROPAGATION_HOPS):
+        """Late arrival minutes of each airport's departures, spread over ``hops`` hops downstream."""
+        transitions, _ = self.transitions()
+        own = np.asarray(self.late_minutes.sum(axis=1)).ravel()
+        score, term = own.copy(), own
+        for _ in range(hops - 1):
+            term = decay * (transitions @ term)
+            score += term
+        return pd.Series(score, index=self.airports)
+
+    def hub_ranking(self):
+        """Degrees, PageRank and delay propagation of every airport, by PageRank."""
+        ranking = self.degrees()
+        ranking['PAGERANK'] = self.pagerank()
+        ranking['DELAY_PROPAGATION'] = self.delay_propagation()
+        return ranking.sort_values('PAGERANK', ascending=False, kind='stable')
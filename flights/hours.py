@@ -0,0 +1,82 @@
+"""Vectorized hour-of-day histograms.
+
+Counts and delay sums per hour x key (airport, airline, ...) are computed
+with a single ``np.bincount`` over ``hour * n_keys + key_code`` instead of a
+``pd.crosstab``. All time-of-day views share these matrices.
+"""
+import numpy as np
+import pandas as pd
+
+HOURS = 24
+
+
+def _codes(keys):
+    if isinstance(keys.dtype, pd.CategoricalDtype):
+        return keys.cat.codes.to_numpy(), keys.cat.categories
+    codes, uniques = pd.factorize(keys)
+    return codes, pd.Index(uniques)
+
+
+def hour_matrix(hours, keys, mask=None, weights=None):
+    """Hour x key matrix of row counts, or of ``weights`` sums when given.
+
+    ``hours`` holds hours of day (negative for missing), ``keys`` the key of
+    each row and ``mask`` an optional boolean selection of rows. Rows with a
+    missing hour or key are left out.
+    """
+    codes, categories = _codes(keys)
+    index_name = getattr(hours, 'name', None)
+    hours = np.asarray(hours)
+    valid = (hours >= 0) & (codes >= 0)
+    if mask is not None:
+        valid &= np.asarray(mask)
+    n_keys = len(categories)
+    flat = hours[valid].astype(np.int64) * n_keys + codes[valid]
+    if weights is not None:
+        weights = np.asarray(weights, dtype=np.float64)[valid]
+    values = np.bincount(flat, weights=weights, minlength=HOURS * n_keys).reshape(HOURS, n_keys)
+    return pd.DataFrame(
+        values,
+        index=pd.RangeIndex(HOURS, name=index_name),
+        columns=pd.Index(categories, name=keys.name),
+    )
+
+
+def drop_empty(matrix):
+    """Drop the hours and keys without any rows, as ``pd.crosstab`` would."""
+    nonzero = matrix.to_numpy() != 0
+    return matrix.loc[nonzero.any(axis=1), nonzero.any(axis=0)]
+
+
+def hour_counts(df, hour_column, key_column, mask=None):
+    """Number of rows per hour x key, like ``pd.crosstab(hour, key)``."""
+    return drop_empty(hour_matrix(df[hour_column], df[key_column], mask))
+
+
+def hour_delays(df, hour_column, key_column, delay_column, mask=None):
+    """Sum of ``delay_column`` per hour x key over the rows in ``mask``."""
+    delays = df[delay_column].fillna(0)
+    counts = hour_matrix(df[hour_column], df[key_column], mask)
+    sums = hour_matrix(df[hour_column], df[key_column], mask, weights=delays)
+    return sums.loc[counts.to_numpy().any(axis=1), counts.to_numpy().any(axis=0)]
+
+
+def merge_hour_matrices(*parts):
+    """Sum hour x key matrices computed over disjoint sets of flights."""
+    # Reindex every part to the union first: ``add(fill_value=0)`` leaves
+    # NaN in cells missing from both sides
+    index, columns = parts[0].index, parts[0].columns
+    for part in parts[1:]:
+        index, columns = index.union(part.index), columns.union(part.columns)
+    merged = parts[0].reindex(index=index, columns=columns, fill_value=0)
+    for part in parts[1:]:
+        merged = merged + part.reindex(index=index, columns=columns, fill_value=0)
+    return merged
+
+
+def merge_hour_counts(*parts):
+    return merge_hour_matrices(*parts).astype('int64')
+
+
+def merge_hour_delays(*parts):
+    return merge_hour_matrices(*parts).astype('float64')
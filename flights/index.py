@@ -0,0 +1,100 @@
+"""Inverted indexes from column values to row positions.
+
+Each indexed column maps every value to the sorted positions of the rows
+holding it. Multiselect filters are answered by the union of the selected
+values' positions and different columns are combined by intersection, so a
+filter costs time in proportion to the matching rows, not to the table.
+"""
+import numpy as np
+import pandas as pd
+
+INDEXED_COLUMNS = ['AIRLINE', 'ORIGIN_AIRPORT', 'DESTINATION_AIRPORT']
+
+EMPTY = np.empty(0, dtype=np.int64)
+
+
+class ValueIndex:
+    """Sorted row positions per value of one column."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    @classmethod
+    def from_column(cls, column, offset=0):
+        codes, uniques = pd.factorize(column)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        rows = {}
+        for code, value in enumerate(uniques):
+            rows[value] = order[bounds[code]:bounds[code + 1]].astype(np.int64) + offset
+        return cls(rows)
+
+    def values(self):
+        """Indexed values in order of first appearance."""
+        return list(self.rows)
+
+    def lookup(self, values):
+        """Sorted positions of the rows holding any of ``values``."""
+        parts = [self.rows[value] for value in values if value in self.rows]
+        if not parts:
+            return EMPTY
+        if len(parts) == 1:
+            return parts[0]
+        return np.sort(np.concatenate(parts))
+
+    def shifted(self, offset):
+        """The same index with every position moved by ``offset``."""
+        return ValueIndex({value: positions + offset for value, positions in self.rows.items()})
+
+    @classmethod
+    def combine(cls, indexes):
+        """Join indexes whose positions follow each other, in that order."""
+        if len(indexes) == 1:
+            return indexes[0]
+        parts = {}
+        for value_index in indexes:
+            for value, positions in value_index.rows.items():
+                parts.setdefault(value, []).append(positions)
+        return cls({value: np.concatenate(positions) if len(positions) > 1 else positions[0]
+                    for value, positions in parts.items()})
+
+
+class FlightIndex:
+    """Value indexes over the airline and airport columns of a frame."""
+
+    def __init__(self, indexes, n_rows):
+        self.indexes = indexes
+        self.n_rows = n_rows
+
+    @classmethod
+    def from_frame(cls, df, columns=INDEXED_COLUMNS, offset=0):
+        indexes = {name: ValueIndex.from_column(df[name], offset) for name in columns}
+        return cls(indexes, len(df))
+
+    def __getitem__(self, column):
+        return self.indexes[column]
+
+    def select(self, **filters):
+        """Positions of the rows matching every ``column=values`` filter."""
+        if not filters:
+            return np.arange(self.n_rows, dtype=np.int64)
+        matches = sorted((self.indexes[column].lookup(values) for column, values in filters.items()), key=len)
+        rows = matches[0]
+        for other in matches[1:]:
+            if not len(rows):
+                break
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows
+
+    @classmethod
+    def combine(cls, indexes):
+        """Join flight indexes whose positions follow each other, in that order."""
+        if len(indexes) == 1:
+            return indexes[0]
+        names = list(indexes[0].indexes)
+        return cls({name: ValueIndex.combine([other.indexes[name] for other in indexes]) for name in names},
+                   sum(other.n_rows for other in indexes))
+
+    def shifted(self, offset):
+        indexes = {name: index.shifted(offset) for name, index in self.indexes.items()}
+        return FlightIndex(indexes, self.n_rows)
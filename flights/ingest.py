@@ -0,0 +1,385 @@
+"""Out-of-core ingestion of a directory of flight files.
+
+Files (CSV or Parquet, e.g. one per month) are streamed CHUNK_ROWS rows at a
+time, projected to the columns the app uses and compacted. Each chunk is
+written as a Parquet partition, in row groups of ROW_GROUP_ROWS rows, and
+folded into the store's aggregates and indexes, so at most one chunk of raw
+rows is in memory during ingestion. The finished store is pickled next to its
+partitions and reused until the set of source files changes.
+
+:func:`update_directory` moves a store to a newer state of its directory
+when files were only added or CSV files only appended to: just the new
+files and the appended bytes are read, and their partitions are appended
+to the existing ones in a new version directory. CSV files are read up to
+their last newline, so a line still being written is left for a later
+update. An appended version saves only the partials of its new rows and
+the name of the version it extends; every MAX_APPENDS appends a full store
+is pickled again. :func:`prune_stores` deletes the saved versions a store
+no longer needs, keeping the partitions it reads.
+
+With ``workers`` above 1 the files are spread over a process pool. Workers
+write the partitions and compute their partial aggregates; the parent merges
+the partials in file and chunk order, so the store is identical to a serial
+build (compare :meth:`~flights.store.FlightStore.fingerprint`, or run
+``python -m flights.ingest DIRECTORY --workers N --verify``).
+"""
+import argparse
+import concurrent.futures
+import glob
+import hashlib
+import io
+import json
+import os
+import pickle
+import shutil
+import tempfile
+
+import pyarrow.parquet as pq
+import pandas as pd
+
+from flights import loader, table
+from flights.store import StoreBuilder, partial_aggregates
+
+CHUNK_ROWS = 500_000
+# Rows per Parquet row group, the unit FlightStore.take reads from a partition
+ROW_GROUP_ROWS = 16_384
+WORKERS = int(os.environ.get('FLIGHTS_WORKERS', '1'))
+SOURCE_PATTERNS = ['*.csv', '*.csv.gz', '*.parquet']
+PROJECTED_COLUMNS = list(loader.COLUMN_TYPES) + list(table.HOUR_COLUMNS)
+# Versioned so that stores pickled before a change of their fields are rebuilt
+STORE_FILE = 'store-4.pkl'
+APPEND_FILE = 'append-4.pkl'
+# Appended versions saved as partials before a full store is pickled again
+MAX_APPENDS = 16
+
+
+def source_files(directory):
+    files = set()
+    for pattern in SOURCE_PATTERNS:
+        files.update(glob.glob(os.path.join(directory, pattern)))
+    return sorted(files)
+
+
+def line_end(path, size, block_size=1 << 16):
+    """Offset just after the last newline in the first ``size`` bytes of ``path``, 0 if none."""
+    with open(path, 'rb') as f:
+        end = size
+        while end > 0:
+            start = max(0, end - block_size)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b'\n')
+            if newline >= 0:
+                return start + newline + 1
+            end = start
+    return 0
+
+
+def manifest(files):
+    """Name, size and modification time of each source file.
+
+    The size of a CSV file counts its complete lines only.
+    """
+    entries = []
+    for path in files:
+        stat = os.stat(path)
+        size = line_end(path, stat.st_size) if path.endswith('.csv') else stat.st_size
+        entries.append([os.path.basename(path), size, stat.st_mtime_ns])
+    return entries
+
+
+def manifest_version(entries):
+    return hashlib.sha256(json.dumps(entries).encode('utf-8')).hexdigest()[:16]
+
+
+class ByteRange(io.RawIOBase):
+    """Read-only view of the bytes of a binary file up to ``end``."""
+
+    def __init__(self, f, end):
+        self.f = f
+        self.end = end
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.f.read(max(0, min(len(buffer), self.end - self.f.tell())))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def read_chunks(path, chunk_rows=CHUNK_ROWS, offset=0, end=None):
+    """Yield ``path`` as frames of at most ``chunk_rows`` projected rows.
+
+    A non-zero ``offset`` reads the rows of a CSV file from that byte on,
+    which must be the start of a line, with the header of the file. ``end``
+    stops a CSV file at that byte, e.g. the size recorded by :func:`manifest`.
+    """
+    if path.endswith('.parquet'):
+        parquet_file = pq.ParquetFile(path)
+        columns = [name for name in parquet_file.schema_arrow.names if name in PROJECTED_COLUMNS]
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+        return
+    dtypes = {name: 'float64' for name in table.FLOAT32_COLUMNS}
+    usecols = lambda name: name in PROJECTED_COLUMNS
+    if not path.endswith('.csv') or (end is None and not offset):
+        yield from pd.read_csv(path, usecols=usecols, dtype=dtypes, chunksize=chunk_rows)
+        return
+    end = os.path.getsize(path) if end is None else end
+    if end <= offset:
+        return
+    header = {}
+    if offset:
+        header = {'header': None, 'names': list(pd.read_csv(path, nrows=0).columns)}
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        with io.BufferedReader(ByteRange(f, end)) as lines:
+            yield from pd.read_csv(lines, usecols=usecols, dtype=dtypes, chunksize=chunk_rows, **header)
+
+
+def ingest_file(file_number, path, out_dir, chunk_rows=CHUNK_ROWS, offset=0, end=None):
+    """Write the partitions of one source file and return their partials.
+
+    ``offset`` and ``end`` bound the bytes read as in :func:`read_chunks`.
+    Returns a list of ``(partition_path, n_rows, partials)`` in chunk order.
+    """
+    results = []
+    for chunk_number, chunk in enumerate(read_chunks(path, chunk_rows, offset, end)):
+        chunk = table.compact_frame(chunk.reset_index(drop=True))
+        partition_path = os.path.join(out_dir, 'part-%05d-%05d.parquet' % (file_number, chunk_number))
+        chunk.to_parquet(partition_path, index=False, row_group_size=ROW_GROUP_ROWS)
+        results.append((partition_path, len(chunk), partial_aggregates(chunk)))
+    return results
+
+
+def build_store(files, out_dir, version, chunk_rows=CHUNK_ROWS, workers=1, ends=None):
+    """Ingest ``files`` into partitions under ``out_dir`` and return the store.
+
+    ``ends`` holds the byte at which to stop each file, as recorded by
+    :func:`manifest`; by default the files are read to their end.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    ends = ends or [None] * len(files)
+    builder = StoreBuilder()
+    if workers > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(ingest_file, file_number, path, out_dir, chunk_rows, 0, end)
+                for file_number, (path, end) in enumerate(zip(files, ends))
+            ]
+            for future in futures:
+                for partition_path, n_rows, partials in future.result():
+                    builder.add_partials(partials, partition_path, n_rows)
+    else:
+        for file_number, (path, end) in enumerate(zip(files, ends)):
+            for partition_path, n_rows, partials in ingest_file(file_number, path, out_dir, chunk_rows, 0, end):
+                builder.add_partials(partials, partition_path, n_rows)
+    return builder.build(version)
+
+
+def ends_line(path, offset):
+    """Whether the byte of ``path`` before ``offset`` is a newline."""
+    with open(path, 'rb') as f:
+        f.seek(offset - 1)
+        return f.read(1) == b'\n'
+
+
+def appended_files(directory, old_entries, new_entries):
+    """``(name, offset, end)`` of the bytes to read to go from one manifest to the next.
+
+    Returns None when the change is not an append: a file was removed, a
+    file other than an uncompressed CSV changed, or a CSV file shrank or no
+    longer ends its old content with a newline. A CSV file whose only
+    change is an incomplete last line has nothing to read yet.
+    """
+    old = {name: (size, mtime) for name, size, mtime in old_entries}
+    appended = []
+    for name, size, mtime in new_entries:
+        if name not in old:
+            appended.append((name, 0, size))
+            continue
+        old_size, old_mtime = old.pop(name)
+        if (size, mtime) == (old_size, old_mtime):
+            continue
+        path = os.path.join(directory, name)
+        if not name.endswith('.csv') or size < old_size or (old_size and not ends_line(path, old_size)):
+            return None
+        if size == old_size:
+            if os.path.getsize(path) > size:
+                continue
+            return None
+        appended.append((name, old_size, size))
+    return None if old else appended
+
+
+def store_dir_of(directory, version, store_dir=loader.SNAPSHOT_DIR):
+    return os.path.join(store_dir, '%s-%s' % (loader.source_key(directory), version))
+
+
+def append_results(store, results, version):
+    """A new store with the rows of ``store`` followed by those of :func:`ingest_file` ``results``."""
+    builder = StoreBuilder.from_store(store)
+    for partition_path, n_rows, partials in results:
+        builder.add_partials(partials, partition_path, n_rows)
+    return builder.build(version, store.memory_report)
+
+
+def read_append(out_dir, partials=True):
+    """``(base, version, results)`` saved by :func:`save_append`; results are None without ``partials``."""
+    with open(os.path.join(out_dir, APPEND_FILE), 'rb') as f:
+        base, version = pickle.load(f)
+        return base, version, pickle.load(f) if partials else None
+
+
+def save_append(out_dir, base, version, results):
+    """Save a version as the directory name of the version it extends and the ingest results of its new rows."""
+    append_path = os.path.join(out_dir, APPEND_FILE)
+    tmp_path = '%s.%d.tmp' % (append_path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        pickle.dump((base, version), f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(results, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, append_path)
+
+
+def version_chain(out_dir):
+    """Directories a saved version is loaded from, itself first and its full store last; None if not saved."""
+    chain = [out_dir]
+    while not os.path.exists(os.path.join(chain[-1], STORE_FILE)):
+        if not os.path.exists(os.path.join(chain[-1], APPEND_FILE)):
+            return None
+        base, _, _ = read_append(chain[-1], partials=False)
+        chain.append(os.path.join(os.path.dirname(chain[-1]), base))
+    return chain
+
+
+def load_store(out_dir):
+    """The store saved under ``out_dir``, or None."""
+    chain = version_chain(out_dir)
+    if chain is None:
+        return None
+    with open(os.path.join(chain[-1], STORE_FILE), 'rb') as f:
+        store = pickle.load(f)
+    # Replay the appends one version at a time, as update_directory built them
+    for append_dir in reversed(chain[:-1]):
+        _, version, results = read_append(append_dir)
+        store = append_results(store, results, version)
+    return store
+
+
+def save_store(store, out_dir):
+    store_path = os.path.join(out_dir, STORE_FILE)
+    tmp_path = '%s.%d.tmp' % (store_path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(store, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, store_path)
+
+
+def ingest_directory(directory, store_dir=loader.SNAPSHOT_DIR, chunk_rows=CHUNK_ROWS, workers=WORKERS):
+    """Build, or reuse, the :class:`~flights.store.FlightStore` of ``directory``."""
+    files = source_files(directory)
+    if not files:
+        raise FileNotFoundError('no flight files found in %s' % directory)
+    entries = manifest(files)
+    version = manifest_version(entries)
+    out_dir = store_dir_of(directory, version, store_dir)
+    store = load_store(out_dir)
+    if store is None:
+        store = build_store(files, out_dir, version, chunk_rows, workers, [size for _, size, _ in entries])
+        save_store(store, out_dir)
+    return store
+
+
+def update_directory(store, entries, directory, store_dir=loader.SNAPSHOT_DIR, chunk_rows=CHUNK_ROWS,
+                     workers=WORKERS):
+    """Bring ``store``, built from the manifest ``entries``, up to date with ``directory``.
+
+    Returns the new store and manifest; ``store`` itself is left untouched
+    and returned when no complete line was added. Appends are ingested
+    incrementally, any other change rebuilds the store.
+    """
+    files = source_files(directory)
+    new_entries = manifest(files)
+    if new_entries == entries:
+        return store, entries
+    if not files:
+        raise FileNotFoundError('no flight files found in %s' % directory)
+    version = manifest_version(new_entries)
+    out_dir = store_dir_of(directory, version, store_dir)
+    new_store = load_store(out_dir)
+    if new_store is not None:
+        return new_store, new_entries
+    appended = appended_files(directory, entries, new_entries)
+    if appended == []:
+        return store, new_entries
+    if appended is None:
+        new_store = build_store(files, out_dir, version, chunk_rows, workers, [size for _, size, _ in new_entries])
+    else:
+        os.makedirs(out_dir, exist_ok=True)
+        results = []
+        for file_number, (name, offset, end) in enumerate(appended):
+            path = os.path.join(directory, name)
+            results += ingest_file(file_number, path, out_dir, chunk_rows, offset, end)
+        new_store = append_results(store, results, version)
+        base_dir = store_dir_of(directory, store.version, store_dir)
+        chain = version_chain(base_dir)
+        if chain is not None and len(chain) < MAX_APPENDS:
+            save_append(out_dir, os.path.basename(base_dir), version, results)
+            return new_store, new_entries
+    save_store(new_store, out_dir)
+    return new_store, new_entries
+
+
+def prune_stores(directory, store, store_dir=loader.SNAPSHOT_DIR):
+    """Delete the saved versions of ``directory`` that ``store`` is not loaded from.
+
+    Partitions of those versions that ``store`` still reads are kept.
+    """
+    current = store_dir_of(directory, store.version, store_dir)
+    keep = {os.path.abspath(path) for path in version_chain(current) or [current]}
+    referenced = {os.path.abspath(partition.source) for partition in store.partitions
+                  if isinstance(partition.source, str)}
+    for version_dir in glob.glob(os.path.join(store_dir, loader.source_key(directory) + '-*')):
+        if not os.path.isdir(version_dir) or os.path.abspath(version_dir) in keep:
+            continue
+        for name in os.listdir(version_dir):
+            path = os.path.join(version_dir, name)
+            if os.path.abspath(path) not in referenced:
+                os.remove(path)
+        if not os.listdir(version_dir):
+            os.rmdir(version_dir)
+
+
+def verify_parallel(directory, workers, chunk_rows=CHUNK_ROWS):
+    """Build ``directory`` serially and with ``workers`` processes; return both fingerprints."""
+    files = source_files(directory)
+    entries = manifest(files)
+    version = manifest_version(entries)
+    ends = [size for _, size, _ in entries]
+    fingerprints = []
+    for n_workers in (1, workers):
+        out_dir = tempfile.mkdtemp(prefix='flights-verify-')
+        try:
+            fingerprints.append(build_store(files, out_dir, version, chunk_rows, n_workers, ends).fingerprint())
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+    return fingerprints
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ingest a directory of flight files.')
+    parser.add_argument('directory')
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--verify', action='store_true',
+                        help='check that a parallel build matches a serial build')
+    args = parser.parse_args()
+    if args.verify:
+        serial, parallel = verify_parallel(args.directory, args.workers, args.chunk_rows)
+        print('serial   %s\nparallel %s' % (serial, parallel))
+        raise SystemExit(0 if serial == parallel else 1)
+    store = ingest_directory(args.directory, chunk_rows=args.chunk_rows, workers=args.workers)
+    print('%d rows in %d partitions, version %s' % (store.n_rows, len(store.partitions), store.version))
+
+
+if __name__ == '__main__':
+    main()
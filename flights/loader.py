@@ -0,0 +1,138 @@
+"""Load the flights dataset through a local, memory-mapped Arrow snapshot.
+
+The first load of a source (URL or local CSV path) parses the CSV once with
+typed columns and writes an Arrow IPC file under the snapshot directory,
+named after the source and a hash of its content. Later loads of the same
+content memory-map that file instead of parsing CSV again, and when a URL
+cannot be fetched the newest snapshot of that source is used so the app can
+start offline.
+"""
+import collections
+import glob
+import hashlib
+import os
+import urllib.request
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+SNAPSHOT_DIR = os.environ.get('FLIGHTS_SNAPSHOT_DIR', '.flights_cache')
+FETCH_TIMEOUT = 30
+
+# Column types for the fields the app uses. Anything else is inferred.
+COLUMN_TYPES = {
+    'AIRLINE': pa.string(),
+    'FLIGHT_NUMBER': pa.int32(),
+    'ORIGIN_AIRPORT': pa.string(),
+    'DESTINATION_AIRPORT': pa.string(),
+    'SCHEDULED_TIME': pa.float64(),
+    'ELAPSED_TIME': pa.float64(),
+    'DISTANCE': pa.float64(),
+    'DEPARTURE_DELAY': pa.float64(),
+    'DESTINATION_DELAY': pa.float64(),
+    'ORIGIN_AIRPORT_LAT': pa.float64(),
+    'ORIGIN_AIRPORT_LON': pa.float64(),
+    'DESTINATION_AIRPORT_LAT': pa.float64(),
+    'DESTINATION_AIRPORT_LON': pa.float64(),
+}
+
+# n_bytes is the size of the source read for this snapshot, None for the offline fallback
+Snapshot = collections.namedtuple('Snapshot', ['version', 'path', 'table', 'n_bytes'])
+
+
+def is_url(source):
+    return source.startswith(('http://', 'https://'))
+
+
+def source_key(source):
+    """Short stable key identifying where the data comes from."""
+    if not is_url(source):
+        source = os.path.abspath(source)
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()[:12]
+
+
+def read_source(source):
+    """Return the raw CSV bytes of a URL or a local file."""
+    if is_url(source):
+        with urllib.request.urlopen(source, timeout=FETCH_TIMEOUT) as response:
+            return response.read()
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+def complete_lines(raw):
+    """``raw`` up to and including its last newline, dropping a line still being written."""
+    return raw[:raw.rfind(b'\n') + 1]
+
+
+def content_hash(raw):
+    return hashlib.sha256(raw).hexdigest()[:16]
+
+
+def snapshot_path(source, version, snapshot_dir=SNAPSHOT_DIR):
+    return os.path.join(snapshot_dir, '%s-%s.arrow' % (source_key(source), version))
+
+
+def parse_csv(raw):
+    """Parse CSV bytes into an Arrow table with the app's column types."""
+    convert_options = pa_csv.ConvertOptions(column_types=COLUMN_TYPES)
+    return pa_csv.read_csv(pa.py_buffer(raw), convert_options=convert_options)
+
+
+def write_snapshot(table, path):
+    """Write ``table`` as an Arrow IPC file, replacing ``path`` atomically."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path):
+    """Memory-map a snapshot; the table's buffers point into the mapped file."""
+    return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+
+def latest_snapshot(source, snapshot_dir=SNAPSHOT_DIR):
+    """Return the newest snapshot path written for ``source``, or None."""
+    paths = glob.glob(os.path.join(snapshot_dir, '%s-*.arrow' % source_key(source)))
+    if not paths:
+        return None
+    return max(paths, key=os.path.getmtime)
+
+
+def prune_snapshots(source, version, snapshot_dir=SNAPSHOT_DIR):
+    """Delete the snapshots of ``source`` other than the one of ``version``."""
+    keep = snapshot_path(source, version, snapshot_dir)
+    for path in glob.glob(os.path.join(snapshot_dir, '%s-*.arrow' % source_key(source))):
+        if path != keep:
+            os.remove(path)
+
+
+def version_of(path):
+    return os.path.basename(path).rsplit('.', 1)[0].split('-', 1)[1]
+
+
+def load_snapshot(source, snapshot_dir=SNAPSHOT_DIR):
+    """Load ``source`` as a :class:`Snapshot`, building it on first use.
+
+    A URL that cannot be fetched falls back to the newest local snapshot of
+    the same source; the error is re-raised when there is none. A local file
+    is read up to its last newline, and ``n_bytes`` is that length.
+    """
+    try:
+        raw = read_source(source)
+    except OSError:
+        path = latest_snapshot(source, snapshot_dir)
+        if path is None:
+            raise
+        return Snapshot(version_of(path), path, read_snapshot(path), None)
+    if not is_url(source):
+        raw = complete_lines(raw)
+
+    version = content_hash(raw)
+    path = snapshot_path(source, version, snapshot_dir)
+    if not os.path.exists(path):
+        write_snapshot(parse_csv(raw), path)
+    return Snapshot(version, path, read_snapshot(path), len(raw))
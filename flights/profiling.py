@@ -0,0 +1,115 @@
+"""Per-rerun profiling spans for the Streamlit pages.
+
+A :class:`Profiler` lives for one script rerun. Pages wrap their stages in
+:meth:`Profiler.span` and send charts and tables to Streamlit through
+:meth:`Profiler.render`, which also records the serialized payload size
+when payload measurement is on. At the end of the rerun the spans can be
+shown in the sidebar debug panel and appended as one JSON line to
+PROFILE_LOG, from which latency percentiles per page can be aggregated.
+"""
+import contextlib
+import json
+import os
+import time
+
+import pandas as pd
+import pyarrow as pa
+
+# JSON lines log of every rerun's spans; profiling is not logged when unset
+PROFILE_LOG = os.environ.get('FLIGHTS_PROFILE_LOG')
+
+
+def payload_bytes(obj):
+    """Size of ``obj`` as sent to the browser: Arrow IPC for frames, JSON for figures."""
+    if isinstance(obj, pd.Series):
+        obj = obj.to_frame()
+    if isinstance(obj, pd.DataFrame):
+        table = pa.Table.from_pandas(obj)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().size
+    if hasattr(obj, 'to_json'):
+        return len(obj.to_json())
+    return None
+
+
+def row_count(obj):
+    return len(obj) if isinstance(obj, (pd.DataFrame, pd.Series)) else None
+
+
+class Span:
+
+    def __init__(self, stage, rows_in=None):
+        self.stage = stage
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.payload_bytes = None
+        self.ms = None
+
+    def to_dict(self):
+        return {
+            'stage': self.stage,
+            'ms': round(self.ms, 3),
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'payload_bytes': self.payload_bytes,
+        }
+
+
+class Profiler:
+
+    def __init__(self, page=None, measure_payloads=False, log_path=PROFILE_LOG):
+        self.page = page
+        self.measure_payloads = measure_payloads or bool(log_path)
+        self.log_path = log_path
+        self.spans = []
+        self.started = time.perf_counter()
+
+    @contextlib.contextmanager
+    def span(self, stage, rows_in=None):
+        """Time the enclosed block; the yielded :class:`Span` takes ``rows_out``."""
+        span = Span(stage, rows_in)
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span.ms = (time.perf_counter() - start) * 1000
+            self.spans.append(span)
+
+    def render(self, stage, st_function, obj, *args, **kwargs):
+        """Call ``st_function(obj, ...)`` inside a span recording its payload."""
+        with self.span(stage, rows_in=row_count(obj)) as span:
+            if self.measure_payloads:
+                span.payload_bytes = payload_bytes(obj)
+            return st_function(obj, *args, **kwargs)
+
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def to_dataframe(self):
+        return pd.DataFrame([span.to_dict() for span in self.spans],
+                            columns=['stage', 'ms', 'rows_in', 'rows_out', 'payload_bytes'])
+
+    def record(self):
+        return {
+            'ts': time.time(),
+            'page': self.page,
+            'total_ms': round(self.total_ms(), 3),
+            'spans': [span.to_dict() for span in self.spans],
+        }
+
+    def write_log(self):
+        """Append this rerun as one JSON line to the log, if one is configured."""
+        if not self.log_path:
+            return
+        with open(self.log_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(self.record()) + '\n')
+
+
+def latency_percentiles(log_path, percentiles=(50, 90, 99)):
+    """Rerun latency percentiles (ms) per page from a profile log."""
+    with open(log_path, encoding='utf-8') as f:
+        records = pd.DataFrame([json.loads(line) for line in f if line.strip()])
+    grouped = records.groupby('page')['total_ms']
+    return pd.DataFrame({'p%d' % p: grouped.quantile(p / 100) for p in percentiles}).assign(reruns=grouped.size())
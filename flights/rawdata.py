@@ -0,0 +1,108 @@
+"""Paginated views and chunked exports of the raw flights table.
+
+Only the rows of the visible page are ever taken out of the table, and
+exports are written to disk CHUNK_ROWS rows at a time, so neither grows in
+memory with the size of the dataset. Each download gets its own temporary
+export file, which the caller removes once it has been served. Both accept an optional array of row
+positions to work on a filtered subset.
+"""
+import os
+import tempfile
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+PAGE_SIZES = [50, 100, 500, 1000]
+CHUNK_ROWS = 100_000
+EXPORT_FORMATS = {'CSV': ('csv', 'text/csv'), 'Parquet': ('parquet', 'application/octet-stream')}
+
+
+def sort_ranks(column, ascending=True):
+    """Rank of every row when the table is sorted by ``column``.
+
+    Missing values sort last and ties keep table order.
+    """
+    order = column.reset_index(drop=True).sort_values(
+        ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+    ranks = np.empty(len(order), dtype=np.int64)
+    ranks[order] = np.arange(len(order))
+    return ranks
+
+
+def page_count(n_rows, page_size):
+    return max(1, -(-n_rows // page_size))
+
+
+def page_rows(n_rows, page, page_size, rows=None, ranks=None):
+    """Positions of the rows on ``page`` (1-based) of the selected rows.
+
+    ``rows`` restricts the view to a subset of positions and ``ranks``, from
+    :func:`sort_ranks`, orders it; without them the table order is used.
+    """
+    start = (page - 1) * page_size
+    if rows is None:
+        if ranks is None:
+            return np.arange(start, min(start + page_size, n_rows))
+        rows = np.arange(n_rows)
+    if ranks is not None:
+        keys = ranks[rows]
+        end = min(start + page_size, len(rows))
+        if end <= start:
+            return rows[:0]
+        window = np.argpartition(keys, end - 1)[:end] if end < len(rows) else np.arange(len(rows))
+        window = window[np.argsort(keys[window])]
+        return rows[window[start:end]]
+    return rows[start:start + page_size]
+
+
+def iter_chunks(store, rows=None, chunk_rows=CHUNK_ROWS):
+    """Yield the selected rows of a :class:`~flights.store.FlightStore` in chunks."""
+    n_rows = store.n_rows if rows is None else len(rows)
+    for start in range(0, n_rows, chunk_rows):
+        if rows is None:
+            yield store.take(np.arange(start, min(start + chunk_rows, n_rows)))
+        else:
+            yield store.take(rows[start:start + chunk_rows])
+
+
+def write_csv(store, path, rows=None, chunk_rows=CHUNK_ROWS):
+    """Write the selected rows of ``store`` to ``path`` as CSV, chunk by chunk."""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        header = True
+        for chunk in iter_chunks(store, rows, chunk_rows):
+            chunk.to_csv(f, header=header)
+            header = False
+        if header:
+            store.empty().to_csv(f)
+
+
+def write_parquet(store, path, rows=None, chunk_rows=CHUNK_ROWS):
+    """Write the selected rows of ``store`` to ``path`` as Parquet, chunk by chunk."""
+    schema = store.schema()
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in iter_chunks(store, rows, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def export(store, path, fmt, rows=None):
+    """Write the selected rows to ``path`` in one of EXPORT_FORMATS, atomically."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    if EXPORT_FORMATS[fmt][0] == 'csv':
+        write_csv(store, tmp_path, rows)
+    else:
+        write_parquet(store, tmp_path, rows)
+    os.replace(tmp_path, path)
+    return path
+
+
+def temporary_export(store, fmt, rows=None):
+    """Write the selected rows to a new temporary file and return its path."""
+    fd, path = tempfile.mkstemp(prefix='flights-export-', suffix='.' + EXPORT_FORMATS[fmt][0])
+    os.close(fd)
+    try:
+        return export(store, path, fmt, rows)
+    except BaseException:
+        os.remove(path)
+        raise
@@ -0,0 +1,157 @@
+"""Background refresh of a local flights source.
+
+A :class:`Dataset` holds the current :class:`~flights.store.FlightStore` of
+a source. For a local CSV file or directory, :meth:`Dataset.start` checks
+the source every REFRESH_SECONDS in a daemon thread. Rows appended to a
+CSV file and, for a directory, new files are ingested on their own and
+folded into a copy of the aggregates and indexes; other changes reload the
+source. The finished store replaces ``Dataset.store`` in one assignment, so
+readers get either the old or the new version and never wait for a
+refresh. URL sources are loaded once.
+"""
+import os
+import threading
+import time
+
+from flights import ingest, loader, store, table
+
+# Seconds between checks of a local source; 0 disables the refresh
+REFRESH_SECONDS = float(os.environ.get('FLIGHTS_REFRESH_SECONDS', '60'))
+
+
+def load_file(source):
+    """Store of a CSV file or URL, and the number of bytes it was built from."""
+    snapshot = loader.load_snapshot(source)
+    raw = snapshot.table.to_pandas()
+    data = table.compact_frame(raw)
+    flight_store = store.FlightStore.from_frame(snapshot.version, data, table.memory_report(raw, data))
+    return flight_store, snapshot.n_bytes
+
+
+def read_tail(path, offset, end):
+    """Compacted rows of the complete lines of ``path`` between bytes ``offset`` and ``end``.
+
+    Returns the rows, or None when there is no complete new line, and the
+    offset just after the last line read.
+    """
+    with open(path, 'rb') as f:
+        header = f.readline()
+        f.seek(offset)
+        tail = f.read(end - offset)
+    tail = loader.complete_lines(tail)
+    if not tail:
+        return None, offset
+    rows = table.compact_frame(loader.parse_csv(header + tail).to_pandas())
+    return rows, offset + len(tail)
+
+
+def append_rows(flight_store, rows, version):
+    """A new store with the rows of ``flight_store`` followed by ``rows``."""
+    builder = store.StoreBuilder.from_store(flight_store)
+    builder.add(rows, rows)
+    return builder.build(version, flight_store.memory_report)
+
+
+class Dataset:
+
+    def __init__(self, source, flight_store, state):
+        self.source = source
+        self.store = flight_store
+        # Manifest entries of a directory, (offset, mtime_ns) of a file
+        self.state = state
+        self.refreshed_at = time.time()
+        self.error = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @classmethod
+    def load(cls, source):
+        if os.path.isdir(source):
+            entries = ingest.manifest(ingest.source_files(source))
+            flight_store = ingest.ingest_directory(source)
+            # Files that changed during the ingestion are picked up by a full reload
+            if ingest.manifest_version(entries) != flight_store.version:
+                entries = None
+            dataset = cls(source, flight_store, entries)
+        else:
+            flight_store, n_bytes = load_file(source)
+            state = None
+            if not loader.is_url(source) and n_bytes is not None:
+                state = (n_bytes, os.stat(source).st_mtime_ns)
+            dataset = cls(source, flight_store, state)
+        dataset.prune()
+        return dataset
+
+    @property
+    def watchable(self):
+        return not loader.is_url(self.source)
+
+    def refresh(self):
+        """Bring the store up to date with the source; True when a new version was swapped in."""
+        with self._lock:
+            if os.path.isdir(self.source):
+                new_store, state = self._refresh_directory()
+            else:
+                new_store, state = self._refresh_file()
+            changed = new_store is not self.store
+            self.state = state
+            self.store = new_store
+            self.refreshed_at = time.time()
+            if changed:
+                self.prune()
+            return changed
+
+    def prune(self):
+        """Delete the saved versions of a local source that the current store does not use.
+
+        A CSV file keeps the snapshot the store was loaded from; after an
+        append the store holds its rows in memory and no snapshot is kept.
+        """
+        if not self.watchable:
+            return
+        if os.path.isdir(self.source):
+            ingest.prune_stores(self.source, self.store)
+        else:
+            loader.prune_snapshots(self.source, self.store.version)
+
+    def _refresh_directory(self):
+        if self.state is None:
+            entries = ingest.manifest(ingest.source_files(self.source))
+            new_store = ingest.ingest_directory(self.source)
+            if new_store.version == self.store.version:
+                new_store = self.store
+            return new_store, entries if ingest.manifest_version(entries) == new_store.version else None
+        return ingest.update_directory(self.store, self.state, self.source)
+
+    def _refresh_file(self):
+        stat = os.stat(self.source)
+        if self.state is not None:
+            offset, mtime = self.state
+            if stat.st_mtime_ns == mtime:
+                return self.store, self.state
+            if stat.st_size > offset and ingest.ends_line(self.source, offset):
+                rows, new_offset = read_tail(self.source, offset, stat.st_size)
+                if rows is None:
+                    return self.store, self.state
+                version = loader.content_hash(('%s:%d' % (self.store.version, new_offset)).encode('utf-8'))
+                return append_rows(self.store, rows, version), (new_offset, stat.st_mtime_ns)
+        new_store, n_bytes = load_file(self.source)
+        if new_store.version == self.store.version:
+            new_store = self.store
+        return new_store, (n_bytes, stat.st_mtime_ns)
+
+    def start(self, interval=REFRESH_SECONDS):
+        """Refresh every ``interval`` seconds in a daemon thread; errors are kept in ``error``."""
+        if self._thread is not None or not interval or not self.watchable:
+            return
+        self._thread = threading.Thread(target=self._run, args=(interval,), name='flights-refresh', daemon=True)
+        self._thread.start()
+
+    def _run(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.refresh()
+                self.error = None
+            except Exception as error:
+                self.error = repr(error)
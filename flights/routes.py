@@ -0,0 +1,98 @@
+"""Route-level payloads for the GreatCircleLayer maps.
+
+Flights sharing an origin and destination are drawn as a single arc, so the
+map payload grows with the number of routes rather than flights. Each route
+carries its flight count and delay totals and means; the count drives the
+arc width and the mean delays colour its two ends.
+"""
+import numpy as np
+import pandas as pd
+
+ROUTE_KEYS = ['ORIGIN_AIRPORT', 'DESTINATION_AIRPORT']
+
+EARLY_RGB = np.array([0, 255, 0, 160])
+LATE_RGB = np.array([250, 100, 0, 160])
+# Mean delay (minutes) at which an arc end is fully early or fully late coloured
+DELAY_COLOR_RANGE = 30.0
+MAX_STROKE_WIDTH = 20.0
+MIN_STROKE_WIDTH = 1.0
+
+MAX_ROUTES = 5000
+# Level of detail for dense selections: minimum flights per drawn route
+DETAIL_LEVELS = {
+    'All routes': 1,
+    'Routes with 5+ flights': 5,
+    'Routes with 20+ flights': 20,
+}
+
+
+def aggregate_routes(df):
+    """Collapse a flights frame into one row per (origin, destination) route."""
+    grouped = df.groupby(ROUTE_KEYS, observed=True, sort=False)
+    routes = grouped.agg(
+        ORIGIN_AIRPORT_LAT=('ORIGIN_AIRPORT_LAT', 'first'),
+        ORIGIN_AIRPORT_LON=('ORIGIN_AIRPORT_LON', 'first'),
+        DESTINATION_AIRPORT_LAT=('DESTINATION_AIRPORT_LAT', 'first'),
+        DESTINATION_AIRPORT_LON=('DESTINATION_AIRPORT_LON', 'first'),
+        FLIGHTS=('ORIGIN_AIRPORT', 'size'),
+        DEPARTURE_DELAY_TOTAL=('DEPARTURE_DELAY', 'sum'),
+        DEPARTURE_DELAY_COUNT=('DEPARTURE_DELAY', 'count'),
+        DESTINATION_DELAY_TOTAL=('DESTINATION_DELAY', 'sum'),
+        DESTINATION_DELAY_COUNT=('DESTINATION_DELAY', 'count'),
+    )
+    return _finish(routes.reset_index())
+
+
+def merge_routes(*parts):
+    """Combine route tables aggregated from disjoint sets of flights."""
+    routes = pd.concat(parts, ignore_index=True)
+    for key in ROUTE_KEYS:
+        routes[key] = routes[key].astype(str)
+    routes = routes.groupby(ROUTE_KEYS, sort=False).agg(
+        ORIGIN_AIRPORT_LAT=('ORIGIN_AIRPORT_LAT', 'first'),
+        ORIGIN_AIRPORT_LON=('ORIGIN_AIRPORT_LON', 'first'),
+        DESTINATION_AIRPORT_LAT=('DESTINATION_AIRPORT_LAT', 'first'),
+        DESTINATION_AIRPORT_LON=('DESTINATION_AIRPORT_LON', 'first'),
+        FLIGHTS=('FLIGHTS', 'sum'),
+        DEPARTURE_DELAY_TOTAL=('DEPARTURE_DELAY_TOTAL', 'sum'),
+        DEPARTURE_DELAY_COUNT=('DEPARTURE_DELAY_COUNT', 'sum'),
+        DESTINATION_DELAY_TOTAL=('DESTINATION_DELAY_TOTAL', 'sum'),
+        DESTINATION_DELAY_COUNT=('DESTINATION_DELAY_COUNT', 'sum'),
+    )
+    return _finish(routes.reset_index())
+
+
+def _finish(routes):
+    routes['DEPARTURE_DELAY_MEAN'] = routes['DEPARTURE_DELAY_TOTAL'] / routes['DEPARTURE_DELAY_COUNT']
+    routes['DESTINATION_DELAY_MEAN'] = routes['DESTINATION_DELAY_TOTAL'] / routes['DESTINATION_DELAY_COUNT']
+    routes = routes.sort_values('FLIGHTS', ascending=False, kind='stable')
+    return routes.reset_index(drop=True)
+
+
+def limit_routes(routes, max_routes=MAX_ROUTES, min_flights=1):
+    """Keep the busiest routes with at least ``min_flights`` flights."""
+    routes = routes[routes['FLIGHTS'] >= min_flights]
+    if max_routes is not None:
+        routes = routes.head(max_routes)
+    return routes
+
+
+def delay_colors(mean_delay):
+    t = np.clip(0.5 + np.nan_to_num(mean_delay) / (2 * DELAY_COLOR_RANGE), 0, 1)[:, None]
+    return np.rint(EARLY_RGB * (1 - t) + LATE_RGB * t).astype(int).tolist()
+
+
+def style_routes(routes):
+    """Add the WIDTH, SOURCE_COLOR and TARGET_COLOR columns read by the layer."""
+    flights = np.log1p(routes['FLIGHTS'].to_numpy())
+    scale = flights / flights.max() if len(flights) else flights
+    return routes.assign(
+        WIDTH=MIN_STROKE_WIDTH + (MAX_STROKE_WIDTH - MIN_STROKE_WIDTH) * scale,
+        SOURCE_COLOR=delay_colors(routes['DEPARTURE_DELAY_MEAN'].to_numpy()),
+        TARGET_COLOR=delay_colors(routes['DESTINATION_DELAY_MEAN'].to_numpy()),
+    )
+
+
+def route_payload(df, max_routes=MAX_ROUTES, min_flights=1):
+    """Aggregate, limit and style ``df`` into a GreatCircleLayer payload."""
+    return style_routes(limit_routes(aggregate_routes(df), max_routes, min_flights))
@@ -0,0 +1,156 @@
+"""Mergeable quantile sketches of the delays per airline x airport x hour.
+
+Each delay is counted in a logarithmic bin (the DDSketch scheme): a value
+``x`` with ``|x| >= MIN_VALUE`` falls in bin ``i`` with
+``GAMMA ** (i - 1) < |x| <= GAMMA ** i``, ``GAMMA = (1 + ALPHA) / (1 - ALPHA)``,
+on the side of its sign; smaller values share a zero bin. A sketch is the
+number of delays per (airline, airport, hour, bin), so sketches of disjoint
+sets of flights merge exactly by adding counts, and the sketch of any
+selection is the sum of the selected cells.
+
+Error bound: the quantile ``q`` of a selection of ``n`` delays is reported
+as the representative value of the bin holding the delay of rank
+``floor(q * (n - 1))`` in sorted order (numpy's 'lower' quantile). It is
+within ALPHA relative error of that delay, and within MIN_VALUE of it when
+``|delay| < MIN_VALUE``. ``python -m benchmarks.quantiles`` checks the
+bound against exact quantiles.
+
+Departure delays are keyed by origin airport and departure hour, arrival
+delays by destination airport and arrival hour.
+"""
+import numpy as np
+import pandas as pd
+
+ALPHA = 0.01
+GAMMA = (1 + ALPHA) / (1 - ALPHA)
+MIN_VALUE = 0.01
+# Bin of a value just above MIN_VALUE, so that bins 1, 2, ... are positive values
+BIN_OFFSET = int(np.ceil(np.log(MIN_VALUE) / np.log(GAMMA))) - 1
+SKETCHED = {
+    'DEPARTURE_DELAY': ('ORIGIN_AIRPORT', 'DEPARTURE_HOUR'),
+    'DESTINATION_DELAY': ('DESTINATION_AIRPORT', 'DESTINATION_HOUR'),
+}
+KEYS = ['AIRLINE', 'AIRPORT', 'HOUR']
+PERCENTILES = (50, 90, 99)
+
+
+def value_bins(values):
+    """Signed bin of each value; 0 for ``|value| < MIN_VALUE``."""
+    magnitude = np.abs(values)
+    bins = np.zeros(len(values), dtype=np.int16)
+    large = magnitude >= MIN_VALUE
+    index = np.ceil(np.log(magnitude[large]) / np.log(GAMMA)) - BIN_OFFSET
+    bins[large] = (np.sign(values[large]) * index).astype(np.int16)
+    return bins
+
+
+def bin_values(bins):
+    """Representative value of each signed bin, within ALPHA of every value in it."""
+    magnitude = 2 * GAMMA ** (np.abs(bins) + BIN_OFFSET) / (GAMMA + 1)
+    return np.where(bins == 0, 0.0, np.sign(bins) * magnitude)
+
+
+def sketch_table(df, measure):
+    airport, hour = SKETCHED[measure]
+    values = df[measure].to_numpy(dtype=np.float64, na_value=np.nan)
+    present = ~np.isnan(values)
+    frame = pd.DataFrame({
+        'AIRLINE': df['AIRLINE'][present],
+        'AIRPORT': df[airport][present],
+        'HOUR': df[hour][present],
+        'BIN': value_bins(values[present]),
+    })
+    counts = frame.groupby(KEYS + ['BIN'], observed=True, sort=False).size()
+    return counts.rename('COUNT').reset_index()
+
+
+def merge_tables(tables):
+    """Add up sketch tables of disjoint sets of flights."""
+    frame = pd.concat(tables, ignore_index=True)
+    for key in ('AIRLINE', 'AIRPORT'):
+        parts = [table[key] for table in tables]
+        if all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            frame[key] = pd.api.types.union_categoricals(parts, ignore_order=True)
+    counts = frame.groupby(KEYS + ['BIN'], observed=True, sort=False)['COUNT'].sum()
+    return counts.reset_index()
+
+
+def quantiles(bins, counts, percentiles=PERCENTILES):
+    """Percentiles of a histogram of signed bins, from the bin of the 'lower' rank."""
+    order = np.argsort(bins, kind='stable')
+    bins, cumulative = bins[order], np.cumsum(counts[order])
+    n = cumulative[-1] if len(cumulative) else 0
+    if not n:
+        return {percentile: np.nan for percentile in percentiles}
+    result = {}
+    for percentile in percentiles:
+        rank = int(np.floor(percentile / 100 * (n - 1)))
+        result[percentile] = float(bin_values(bins[np.searchsorted(cumulative, rank, side='right')]))
+    return result
+
+
+class DelaySketches:
+
+    def __init__(self, tables):
+        self.tables = tables
+        self._layouts = {}
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls({measure: sketch_table(df, measure) for measure in SKETCHED})
+
+    @classmethod
+    def combine(cls, sketches):
+        """Combine the sketches of disjoint sets of flights, in one grouping per measure."""
+        if len(sketches) == 1:
+            return sketches[0]
+        return cls({measure: merge_tables([other.tables[measure] for other in sketches]) for measure in SKETCHED})
+
+    def _layout(self, measure):
+        # Rows sorted by cell, with the keys and row range of every cell, so a
+        # selection reads only the rows of its cells.
+        if measure not in self._layouts:
+            table = self.tables[measure]
+            keys = [table[key].cat.codes.to_numpy() for key in KEYS[:2]] + [table['HOUR'].to_numpy()]
+            order = np.lexsort(keys[::-1])
+            keys = [key[order] for key in keys]
+            starts = np.flatnonzero(np.r_[True, np.any([np.diff(key) != 0 for key in keys], axis=0)])
+            bins = table['BIN'].to_numpy()[order].astype(np.int64)
+            counts = table['COUNT'].to_numpy()[order]
+            self._layouts[measure] = {
+                'categories': [table[key].cat.categories for key in KEYS[:2]],
+                'cells': [key[starts] for key in keys],
+                'starts': starts,
+                'ends': np.r_[starts[1:], len(order)],
+                'bins': bins,
+                'counts': counts,
+            }
+        return self._layouts[measure]
+
+    def histogram(self, measure, airlines=None, airports=None, hours=None):
+        """Signed bins and their counts over the selected cells; empty selections select all."""
+        layout = self._layout(measure)
+        selected = np.ones(len(layout['starts']), dtype=bool)
+        for i, values in enumerate((airlines, airports, hours)):
+            if values:
+                codes = layout['categories'][i].get_indexer(list(values)) if i < 2 else np.asarray(values)
+                selected &= np.isin(layout['cells'][i], codes)
+        if selected.all():
+            bins, counts = layout['bins'], layout['counts']
+        else:
+            starts, ends = layout['starts'][selected], layout['ends'][selected]
+            lengths = ends - starts
+            rows = np.repeat(starts - np.r_[0, np.cumsum(lengths)[:-1]], lengths) + np.arange(lengths.sum())
+            bins, counts = layout['bins'][rows], layout['counts'][rows]
+        offset = bins.min() if len(bins) else 0
+        totals = np.bincount(bins - offset, weights=counts, minlength=1)
+        present = np.flatnonzero(totals)
+        return present + offset, totals[present]
+
+    def quantiles(self, measure, percentiles=PERCENTILES, airlines=None, airports=None, hours=None):
+        """``{percentile: delay}`` of ``measure`` over the selected airlines, airports and hours."""
+        bins, counts = self.histogram(measure, airlines, airports, hours)
+        return quantiles(bins, counts, percentiles)
+
+    def count(self, measure, airlines=None, airports=None, hours=None):
+        return int(self.histogram(measure, airlines, airports, hours)[1].sum())
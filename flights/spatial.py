@@ -0,0 +1,142 @@
+"""Spatial index over airport coordinates for the GEO Map Matrix.
+
+A :class:`SpatialIndex` is built once per dataset version from the store's
+route table. Airports are bucketed into a grid of CELL_DEGREES cells, so a
+radius query only measures the distance to the airports of the few cells
+overlapping the circle. Each route's great-circle arc gets a bounding box,
+computed from ARC_SAMPLES points along the arc, so viewport filtering is a
+box overlap test per route instead of geometry per flight.
+"""
+import numpy as np
+import pandas as pd
+
+from flights.routes import ROUTE_KEYS
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = np.pi * EARTH_RADIUS_KM / 180
+CELL_DEGREES = 2.0
+ARC_SAMPLES = 16
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(value) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def unit_vectors(lat, lon):
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def arc_bounds(lat1, lon1, lat2, lon2, samples=ARC_SAMPLES):
+    """(south, west, north, east) of the great-circle arcs between two arrays of points.
+
+    Arcs crossing the antimeridian get the full longitude range.
+    """
+    start, end = unit_vectors(lat1, lon1), unit_vectors(lat2, lon2)
+    t = np.linspace(0, 1, samples)[None, :, None]
+    points = start[:, None, :] * (1 - t) + end[:, None, :] * t
+    points /= np.linalg.norm(points, axis=-1, keepdims=True).clip(1e-12)
+    lat = np.degrees(np.arcsin(points[..., 2].clip(-1, 1)))
+    lon = np.degrees(np.arctan2(points[..., 1], points[..., 0]))
+    wraps = (np.abs(np.diff(lon, axis=1)) > 180).any(axis=1)
+    west = np.where(wraps, -180.0, lon.min(axis=1))
+    east = np.where(wraps, 180.0, lon.max(axis=1))
+    return lat.min(axis=1), west, lat.max(axis=1), east
+
+
+def route_airports(route_table):
+    """Latitude and longitude of every airport of a route table, indexed by code."""
+    ends = [
+        route_table[[key, key + '_LAT', key + '_LON']].set_axis(['AIRPORT', 'LAT', 'LON'], axis=1)
+        for key in ROUTE_KEYS
+    ]
+    airports = pd.concat(ends, ignore_index=True).dropna()
+    airports['AIRPORT'] = airports['AIRPORT'].astype(str)
+    return airports.drop_duplicates('AIRPORT').set_index('AIRPORT')
+
+
+class SpatialIndex:
+
+    def __init__(self, airports, cells, arc_positions, arcs):
+        self.airports = airports
+        self.codes = airports.index
+        self.ids = {code: position for position, code in enumerate(self.codes)}
+        self.lat = airports['LAT'].to_numpy()
+        self.lon = airports['LON'].to_numpy()
+        self.cells = cells
+        # Row of ``arcs`` of the route origin * n_airports + destination, -1 if none
+        self.arc_positions = arc_positions
+        self.arcs = arcs
+
+    @classmethod
+    def from_routes(cls, route_table):
+        airports = route_airports(route_table)
+        cell_rows = np.floor(airports['LAT'].to_numpy() / CELL_DEGREES).astype(np.int64)
+        cell_cols = np.floor(airports['LON'].to_numpy() / CELL_DEGREES).astype(np.int64)
+        cells = {}
+        for position, cell in enumerate(zip(cell_rows, cell_cols)):
+            cells.setdefault(cell, []).append(position)
+        cells = {cell: np.array(positions) for cell, positions in cells.items()}
+        south, west, north, east = arc_bounds(
+            *(route_table[key + suffix].to_numpy(dtype=np.float64)
+              for key in ROUTE_KEYS for suffix in ('_LAT', '_LON')))
+        arcs = np.stack([south, west, north, east], axis=1)
+        index = cls(airports, cells, None, arcs)
+        keys = index.route_ids(route_table)
+        index.arc_positions = np.full(len(airports) ** 2, -1, dtype=np.int64)
+        known = keys >= 0
+        index.arc_positions[keys[known]] = np.flatnonzero(known)
+        return index
+
+    def airport_ids(self, column):
+        """Position of each airport code of ``column`` in the index, -1 if unknown."""
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            ids = np.array([self.ids.get(str(code), -1) for code in column.cat.categories.tolist()], dtype=np.int64)
+            codes = column.cat.codes.to_numpy()
+            return np.where(codes >= 0, ids[codes], -1)
+        return self.codes.get_indexer(column.astype(str))
+
+    def route_ids(self, routes):
+        """origin id * n_airports + destination id of each route, -1 if an end is unknown."""
+        origin, destination = (self.airport_ids(routes[key]) for key in ROUTE_KEYS)
+        return np.where((origin >= 0) & (destination >= 0), origin * len(self.codes) + destination, -1)
+
+    def _candidates(self, south, west, north, east):
+        rows = range(int(np.floor(south / CELL_DEGREES)), int(np.floor(north / CELL_DEGREES)) + 1)
+        if west > east:
+            cols = list(range(int(np.floor(west / CELL_DEGREES)), int(np.floor(180 / CELL_DEGREES)) + 1))
+            cols += list(range(int(np.floor(-180 / CELL_DEGREES)), int(np.floor(east / CELL_DEGREES)) + 1))
+        else:
+            cols = range(int(np.floor(west / CELL_DEGREES)), int(np.floor(east / CELL_DEGREES)) + 1)
+        parts = [self.cells[(row, col)] for row in rows for col in cols if (row, col) in self.cells]
+        return np.concatenate(parts) if parts else np.array([], dtype=np.int64)
+
+    def near(self, lat, lon, radius_km):
+        """Codes of the airports within ``radius_km`` of (lat, lon), nearest first."""
+        lat_span = radius_km / KM_PER_DEGREE
+        south, north = max(lat - lat_span, -90.0), min(lat + lat_span, 90.0)
+        cos_lat = np.cos(np.radians(max(abs(south), abs(north))))
+        lon_span = radius_km / (KM_PER_DEGREE * cos_lat) if cos_lat > 1e-6 else 180.0
+        if lon_span >= 180:
+            west, east = -180.0, 180.0
+        else:
+            west = (lon - lon_span + 180) % 360 - 180
+            east = (lon + lon_span + 180) % 360 - 180
+        candidates = self._candidates(south, west, north, east)
+        distances = haversine_km(lat, lon, self.lat[candidates], self.lon[candidates])
+        order = np.argsort(distances, kind='stable')
+        return self.codes[candidates[order][distances[order] <= radius_km]].tolist()
+
+    def arcs_in_view(self, routes, south, west, north, east):
+        """Boolean mask of the ``routes`` whose arc bounding box overlaps the box."""
+        keys = self.route_ids(routes)
+        positions = np.where(keys >= 0, self.arc_positions[keys], -1)
+        arc_south, arc_west, arc_north, arc_east = self.arcs[positions].T
+        overlaps_lat = (arc_north >= south) & (arc_south <= north)
+        if west > east:
+            overlaps_lon = (arc_east >= west) | (arc_west <= east)
+        else:
+            overlaps_lon = (arc_east >= west) & (arc_west <= east)
+        return (positions < 0) | (overlaps_lat & overlaps_lon)
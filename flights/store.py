@@ -0,0 +1,267 @@
+"""Flights rows together with the structures precomputed from them.
+
+A :class:`FlightStore` holds the aggregate cube, the value indexes, the
+route table, the hour histograms, the hour x airport and hour x airline
+delay matrices, the delay quantile sketches and the Matrix delay fact totals
+of one dataset version, plus the rows
+themselves as a list of partitions. Partitions are either in-memory frames
+or Parquet files; rows are only read from files when a view asks for them
+through :meth:`FlightStore.take` or :meth:`FlightStore.frame`, and
+:meth:`FlightStore.take` reads only the row groups holding the rows asked
+for.
+"""
+import collections
+import hashlib
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from flights import cube, facts, hours, index, routes, sketch
+
+Partition = collections.namedtuple('Partition', ['source', 'start', 'n_rows'])
+
+
+def hour_counts(df):
+    """Early-operation counts per hour x airport for the Dashboard line charts."""
+    departure = hours.hour_counts(df, 'DEPARTURE_HOUR', 'ORIGIN_AIRPORT', df['DEPARTURE_DELAY'] < 0)
+    destination = hours.hour_counts(df, 'DESTINATION_HOUR', 'DESTINATION_AIRPORT', df['DESTINATION_DELAY'] < 0)
+    return departure, destination
+
+
+# Hour, key and delay columns of the delay matrices shared by time-of-day views
+HOUR_DELAYS = {
+    'departure_airport': ('DEPARTURE_HOUR', 'ORIGIN_AIRPORT', 'DEPARTURE_DELAY'),
+    'arrival_airport': ('DESTINATION_HOUR', 'DESTINATION_AIRPORT', 'DESTINATION_DELAY'),
+    'departure_airline': ('DEPARTURE_HOUR', 'AIRLINE', 'DEPARTURE_DELAY'),
+    'arrival_airline': ('DESTINATION_HOUR', 'AIRLINE', 'DESTINATION_DELAY'),
+}
+
+
+def hour_delays(df):
+    """Flights with a delay and their delay minutes per hour x key, for each of HOUR_DELAYS."""
+    matrices = {}
+    for name, (hour_column, key_column, delay_column) in HOUR_DELAYS.items():
+        delayed = df[delay_column].notna()
+        matrices[name] = (
+            hours.hour_counts(df, hour_column, key_column, delayed),
+            hours.hour_delays(df, hour_column, key_column, delay_column, delayed),
+        )
+    return matrices
+
+
+def merge_hour_delays(*parts):
+    return {
+        name: (hours.merge_hour_counts(*(part[name][0] for part in parts)),
+               hours.merge_hour_delays(*(part[name][1] for part in parts)))
+        for name in HOUR_DELAYS
+    }
+
+
+class FlightStore:
+
+    def __init__(self, version, partitions, cube, index, routes, hour_counts, hour_delays, sketches, fact_totals,
+                 memory_report=None):
+        self.version = version
+        self.partitions = partitions
+        self.cube = cube
+        self.index = index
+        self.routes = routes
+        self.hour_counts = hour_counts
+        self.hour_delays = hour_delays
+        self.sketches = sketches
+        self.fact_totals = fact_totals
+        self.memory_report = memory_report
+
+    @classmethod
+    def from_frame(cls, version, df, memory_report=None):
+        builder = StoreBuilder()
+        builder.add(df, df)
+        return builder.build(version, memory_report)
+
+    @property
+    def n_rows(self):
+        return sum(partition.n_rows for partition in self.partitions)
+
+    @property
+    def columns(self):
+        return self.schema().names
+
+    def schema(self, columns=None):
+        """Arrow schema of the rows, from the first partition's metadata only.
+
+        Categoricals are typed as string dictionaries with int32 indices,
+        which hold the codes of any partition.
+        """
+        partition = self.partitions[0]
+        if isinstance(partition.source, pd.DataFrame):
+            schema = pa.Schema.from_pandas(self._read(partition, columns).iloc[:0], preserve_index=False)
+        else:
+            schema = pq.read_schema(partition.source)
+            if columns is not None:
+                schema = pa.schema([schema.field(name) for name in columns])
+        return pa.schema([
+            pa.field(field.name, pa.dictionary(pa.int32(), pa.string())) if pa.types.is_dictionary(field.type) else field
+            for field in schema
+        ])
+
+    def empty(self, columns=None):
+        """A frame without rows with the columns and dtypes of the store."""
+        return self.schema(columns).empty_table().to_pandas()
+
+    def mean_hour_delays(self, name):
+        """Mean delay per hour x key of one of HOUR_DELAYS, NaN where no flight has a delay."""
+        counts, sums = self.hour_delays[name]
+        return sums / counts.where(counts > 0)
+
+    def fingerprint(self):
+        """Hash of the aggregates and indexes, equal for identically built stores."""
+        digest = hashlib.sha256()
+        frames = [self.cube.cells.reset_index(), self.routes] + [counts.reset_index() for counts in self.hour_counts]
+        frames += [matrix.reset_index() for matrices in self.hour_delays.values() for matrix in matrices]
+        frames += list(self.sketches.tables.values())
+        frames += [totals.reset_index() for totals in self.fact_totals.values()]
+        for frame in frames:
+            digest.update(pd.util.hash_pandas_object(frame.astype({
+                name: str for name in frame.columns if isinstance(frame[name].dtype, pd.CategoricalDtype)
+            }), index=False).to_numpy().tobytes())
+        for name, value_index in self.index.indexes.items():
+            for value in sorted(value_index.rows, key=str):
+                digest.update(('%s=%s' % (name, value)).encode('utf-8'))
+                digest.update(value_index.rows[value].tobytes())
+        return digest.hexdigest()
+
+    def _read(self, partition, columns):
+        if isinstance(partition.source, pd.DataFrame):
+            return partition.source if columns is None else partition.source[columns]
+        return pd.read_parquet(partition.source, columns=columns)
+
+    def _read_rows(self, partition, local, columns):
+        # Rows at positions ``local`` of a partition, reading only their row groups
+        if isinstance(partition.source, pd.DataFrame):
+            return self._read(partition, columns).iloc[local]
+        parquet_file = pq.ParquetFile(partition.source)
+        metadata = parquet_file.metadata
+        bounds = np.cumsum([0] + [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)])
+        group_of = np.searchsorted(bounds, local, side='right') - 1
+        groups = np.unique(group_of)
+        frame = parquet_file.read_row_groups(groups.tolist(), columns=columns).to_pandas()
+        # Position in ``frame`` of the first row of each group read
+        firsts = np.r_[0, np.cumsum(bounds[groups + 1] - bounds[groups])[:-1]]
+        return frame.iloc[local - bounds[group_of] + firsts[np.searchsorted(groups, group_of)]]
+
+    def _align(self, frames):
+        # Partitions encode categoricals with their own categories; give them
+        # the store-wide categories, sorted like those of a single compacted
+        # frame, so they concatenate without decoding and sort alphabetically.
+        for name, value_index in self.index.indexes.items():
+            categories = pd.Index(value_index.values()).dropna().sort_values()
+            for i, frame in enumerate(frames):
+                if name in frame and isinstance(frame[name].dtype, pd.CategoricalDtype):
+                    frames[i] = frame.assign(**{name: frame[name].cat.set_categories(categories)})
+        return frames
+
+    def frame(self, columns=None):
+        """All rows, optionally projected to ``columns``, with a RangeIndex."""
+        if len(self.partitions) == 1:
+            return self._read(self.partitions[0], columns)
+        frames = self._align([self._read(partition, columns) for partition in self.partitions])
+        return pd.concat(frames, ignore_index=True)
+
+    def take(self, rows, columns=None):
+        """The rows at positions ``rows``, in that order and indexed by those positions.
+
+        Only the partitions holding at least one of the rows are read.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = np.array([partition.start for partition in self.partitions])
+        owner = np.searchsorted(starts, rows, side='right') - 1
+        frames = []
+        for i in np.unique(owner):
+            partition = self.partitions[i]
+            local = rows[owner == i] - partition.start
+            frame = self._read_rows(partition, local, columns)
+            frames.append(frame.set_axis(local + partition.start))
+        if not frames:
+            return self.empty(columns)
+        if len(frames) == 1:
+            return frames[0]
+        # Frames come grouped by partition; put the rows back in requested order
+        grouped = np.argsort(owner, kind='stable')
+        order = np.empty(len(rows), dtype=np.int64)
+        order[grouped] = np.arange(len(rows))
+        return pd.concat(self._align(frames)).iloc[order]
+
+
+def partial_aggregates(chunk):
+    """Cube, index, route table, hour counts, hour delays, delay sketches and fact totals of one chunk of rows.
+
+    The index positions start at 0; :meth:`StoreBuilder.add_partials` moves
+    them to the chunk's place in the store.
+    """
+    return (
+        cube.AggregateCube.from_frame(chunk),
+        index.FlightIndex.from_frame(chunk),
+        routes.aggregate_routes(chunk),
+        hour_counts(chunk),
+        hour_delays(chunk),
+        sketch.DelaySketches.from_frame(chunk),
+        facts.fact_totals(chunk),
+    )
+
+
+class StoreBuilder:
+    """Builds a :class:`FlightStore` one compacted chunk of rows at a time.
+
+    Chunks must be added in store order. Their partial aggregates are kept
+    and merged once, in that order, by :meth:`build`: each aggregate is one
+    concatenation and grouping over all chunks rather than a regrouping of
+    the running total per chunk. The resulting store does not depend on
+    whether the partials were computed here or in worker processes.
+    """
+
+    def __init__(self):
+        self.partitions = []
+        self.n_rows = 0
+        self.partials = []
+
+    @classmethod
+    def from_store(cls, store):
+        """A builder that appends to the rows and aggregates of ``store``, leaving it unchanged."""
+        builder = cls()
+        builder.partitions = list(store.partitions)
+        builder.n_rows = store.n_rows
+        builder.partials.append((store.cube, store.index, store.routes, store.hour_counts, store.hour_delays,
+                                 store.sketches, store.fact_totals))
+        return builder
+
+    def add(self, chunk, source):
+        """Fold ``chunk`` into the aggregates; ``source`` is where its rows live."""
+        self.add_partials(partial_aggregates(chunk), source, len(chunk))
+
+    def add_partials(self, partials, source, n_rows):
+        """Fold the :func:`partial_aggregates` of ``n_rows`` rows stored at ``source``."""
+        chunk_cube, chunk_index, chunk_routes, chunk_hours, chunk_delays, chunk_sketches, chunk_facts = partials
+        self.partials.append((chunk_cube, chunk_index.shifted(self.n_rows), chunk_routes, chunk_hours, chunk_delays,
+                              chunk_sketches, chunk_facts))
+        self.partitions.append(Partition(source, self.n_rows, n_rows))
+        self.n_rows += n_rows
+
+    def build(self, version, memory_report=None):
+        if len(self.partials) < 2:
+            aggregates = self.partials[0] if self.partials else (None,) * 7
+            return FlightStore(version, self.partitions, *aggregates, memory_report)
+        cubes, indexes, route_tables, counts, delays, sketches, totals = zip(*self.partials)
+        return FlightStore(
+            version,
+            self.partitions,
+            cube.AggregateCube.combine(cubes),
+            index.FlightIndex.combine(indexes),
+            routes.merge_routes(*route_tables),
+            tuple(hours.merge_hour_counts(*parts) for parts in zip(*counts)),
+            merge_hour_delays(*delays),
+            sketch.DelaySketches.combine(sketches),
+            facts.merge_totals(*totals),
+            memory_report,
+        )
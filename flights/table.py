@@ -0,0 +1,68 @@
+"""Compact, shared in-memory representation of the flights table."""
+import pandas as pd
+
+CATEGORY_COLUMNS = ['AIRLINE', 'ORIGIN_AIRPORT', 'DESTINATION_AIRPORT']
+FLOAT32_COLUMNS = [
+    'SCHEDULED_TIME', 'ELAPSED_TIME', 'DISTANCE',
+    'DEPARTURE_DELAY', 'DESTINATION_DELAY',
+    'ORIGIN_AIRPORT_LAT', 'ORIGIN_AIRPORT_LON',
+    'DESTINATION_AIRPORT_LAT', 'DESTINATION_AIRPORT_LON',
+]
+INTEGER_COLUMNS = ['FLIGHT_NUMBER']
+# Timestamp columns and the hour-of-day column derived from each at load time
+HOUR_COLUMNS = {
+    'SCHEDULED_DEPARTURE': 'DEPARTURE_HOUR',
+    'SCHEDULED_DESTINATION': 'DESTINATION_HOUR',
+}
+MISSING_HOUR = -1
+
+
+def hour_of_day(column):
+    """Hour of each timestamp as int8, with MISSING_HOUR for missing values."""
+    hours = pd.to_datetime(column).dt.hour
+    return hours.fillna(MISSING_HOUR).astype('int8')
+
+
+def compact_frame(df):
+    """Return ``df`` with categorical codes and downcast numeric columns.
+
+    Airline and airport codes become categoricals, delays, times, distance
+    and coordinates become float32, and integer columns are downcast to the
+    smallest type holding their range (int16 for flight numbers). Scheduled
+    timestamps are parsed once and get an int8 hour-of-day column next to them.
+    """
+    columns = {}
+    for name in df.columns:
+        column = df[name]
+        if name in CATEGORY_COLUMNS:
+            column = column.astype('category')
+        elif name in FLOAT32_COLUMNS:
+            column = column.astype('float32')
+        elif name in INTEGER_COLUMNS and pd.api.types.is_integer_dtype(column):
+            column = pd.to_numeric(column, downcast='integer')
+        elif name in HOUR_COLUMNS:
+            column = pd.to_datetime(column)
+        columns[name] = column
+        if name in HOUR_COLUMNS:
+            columns[HOUR_COLUMNS[name]] = hour_of_day(column)
+    return pd.DataFrame(columns, index=df.index)
+
+
+def memory_report(before, after):
+    """Bytes per column of two versions of the same frame, plus a total row.
+
+    Columns only present in ``after`` count as zero bytes before.
+    """
+    report = pd.DataFrame({
+        'dtype before': before.dtypes.astype(str),
+        'bytes before': before.memory_usage(index=False, deep=True),
+        'dtype after': after.dtypes.astype(str),
+        'bytes after': after.memory_usage(index=False, deep=True),
+    })
+    report = report.reindex(after.columns.union(before.columns, sort=False))
+    report[['dtype before', 'dtype after']] = report[['dtype before', 'dtype after']].fillna('')
+    report[['bytes before', 'bytes after']] = report[['bytes before', 'bytes after']].fillna(0).astype('int64')
+    report.loc['TOTAL'] = ['', report['bytes before'].sum(), '', report['bytes after'].sum()]
+    saved = 100 * (1 - report['bytes after'] / report['bytes before'])
+    report['saved %'] = saved.where(report['bytes before'] > 0).round(1)
+    return report